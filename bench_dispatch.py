@@ -0,0 +1,87 @@
+"""
+Microbenchmark of the per-message dispatch overhead of process_message.
+
+Compares the registry dispatcher (dictionary lookup + compiled validator)
+with an equivalent if/elif chain as the number of message types grows.
+Handlers do nothing, so only dispatch and validation are measured.
+
+    python3 bench_dispatch.py
+"""
+
+import argparse
+import random
+import timeit
+
+from message_registry import MessageRegistry, NUMBER
+
+SCHEMA = {"lat": NUMBER, "lon": NUMBER, "alt": NUMBER, "speed": [NUMBER, 0]}
+
+
+def noop(args, context):
+    pass
+
+
+def build_registry(count: int) -> MessageRegistry:
+    registry = MessageRegistry()
+    for i in range(count):
+        registry.register(f"type_{i}", SCHEMA)(noop)
+    return registry
+
+
+def build_if_chain(count: int):
+    # Same shape as the original process_message: compare msg_type against
+    # every type in turn, then index into args without validation.
+    lines = [
+        "def dispatch(message, context):",
+        "    message_type = message['msg_type']",
+    ]
+    for i in range(count):
+        keyword = "if" if i == 0 else "elif"
+        lines.append(f"    {keyword} message_type == 'type_{i}':")
+        lines.append(
+            "        noop((message['args']['lat'], message['args']['lon'],"
+            " message['args']['alt']), context)"
+        )
+    lines.append("    else:")
+    lines.append("        raise ValueError('Invalid message type')")
+    namespace = {"noop": noop}
+    exec("\n".join(lines), namespace)
+    return namespace["dispatch"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--types", type=int, nargs="+", default=[5, 15, 50, 200])
+    args = parser.parse_args()
+
+    print(f"{'types':>6} {'registry ns/msg':>16} {'if/elif ns/msg':>16}")
+    for count in args.types:
+        messages = [
+            {
+                "msg_type": f"type_{random.randrange(count)}",
+                "args": {"lat": 41.1, "lon": 29.0, "alt": 10},
+            }
+            for _ in range(args.messages)
+        ]
+        registry = build_registry(count)
+        if_chain = build_if_chain(count)
+
+        def run_registry():
+            for message in messages:
+                registry.dispatch(message)
+
+        def run_if_chain():
+            for message in messages:
+                if_chain(message, None)
+
+        registry_time = min(timeit.repeat(run_registry, number=1, repeat=5))
+        if_chain_time = min(timeit.repeat(run_if_chain, number=1, repeat=5))
+        print(
+            f"{count:>6} {registry_time / args.messages * 1e9:>16.0f}"
+            f" {if_chain_time / args.messages * 1e9:>16.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
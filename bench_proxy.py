@@ -0,0 +1,140 @@
+"""
+Microbenchmark of the MAVLink proxy overhead on the reader thread.
+
+Parses a typical telemetry mix (HEARTBEAT, GLOBAL_POSITION_INT, ATTITUDE,
+SYS_STATUS) the way the reader does, then runs the proxy's downlink hook
+on the parsed messages with different endpoint sets. Local UDP and TCP
+receivers drain the sockets on other threads, so the numbers include the
+real send system calls.
+
+    python3 bench_proxy.py
+"""
+
+import argparse
+import socket
+import threading
+import timeit
+
+from pymavlink import mavutil
+
+from mavlink_proxy import MavlinkProxy
+
+
+def encode_frames(count: int):
+    mav = mavutil.mavlink.MAVLink(None, srcSystem=1, srcComponent=1)
+    frames = []
+    for i in range(count):
+        kind = i % 4
+        if kind == 0:
+            msg = mav.heartbeat_encode(2, 3, 81, 4, 4)
+        elif kind == 1:
+            msg = mav.global_position_int_encode(
+                i, 411055000, 290234000, 10000, 10000, 120, -40, 5, 9000
+            )
+        elif kind == 2:
+            msg = mav.attitude_encode(i, 0.01, -0.02, 1.5, 0.0, 0.0, 0.1)
+        else:
+            msg = mav.sys_status_encode(0, 0, 0, 500, 12000, 1500, 80, 0, 0, 0, 0, 0, 0)
+        frames.append(msg.pack(mav))
+    return frames
+
+
+def drain_udp(sock):
+    while True:
+        sock.recv(65536)
+
+
+def open_receivers(endpoints):
+    """
+    Bind receivers for the given endpoint kinds and return the proxy
+    endpoint strings pointing at them.
+    """
+    result = []
+    for kind in endpoints:
+        if kind == "udp":
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind(("127.0.0.1", 0))
+            threading.Thread(target=drain_udp, args=(sock,), daemon=True).start()
+            result.append(f"udp:127.0.0.1:{sock.getsockname()[1]}")
+        else:
+            # The proxy listens, a client connects and drains
+            port = find_free_port()
+            result.append(f"tcpin:127.0.0.1:{port}")
+    return result
+
+
+def find_free_port() -> int:
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def connect_tcp_clients(proxy_endpoints):
+    for endpoint in proxy_endpoints:
+        kind, host, port = endpoint.split(":")
+        if kind != "tcpin":
+            continue
+        conn = socket.create_connection((host, int(port)))
+
+        def drain(conn=conn):
+            while conn.recv(65536):
+                pass
+
+        threading.Thread(target=drain, daemon=True).start()
+
+
+class NullVehicle:
+    def __init__(self):
+        self.message_hooks = []
+
+    def write(self, buf):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument(
+        "--rate", type=float, default=60, help="Telemetry messages per second"
+    )
+    args = parser.parse_args()
+
+    frames = encode_frames(args.messages)
+    decoder = mavutil.mavlink.MAVLink(None)
+    decoder.robust_parsing = True
+
+    def run_parse():
+        for frame in frames:
+            decoder.parse_buffer(frame)
+
+    parse_time = min(timeit.repeat(run_parse, number=1, repeat=5))
+    messages = [msg for frame in frames for msg in decoder.parse_buffer(frame)]
+    parse_ns = parse_time / len(messages) * 1e9
+
+    print(f"{'endpoints':<16} {'ns/msg':>8} {'vs parse':>9} {'CPU @ rate':>11}")
+    print(f"{'parse only':<16} {parse_ns:>8.0f} {'':>9} {'':>11}")
+    for kinds in ([], ["udp"], ["tcp"], ["udp", "tcp"], ["tcp", "tcp", "tcp"]):
+        endpoints = open_receivers(kinds)
+        proxy = MavlinkProxy(endpoints)
+        proxy.attach(NullVehicle())
+        connect_tcp_clients(endpoints)
+        # Let the proxy thread accept the clients
+        threading.Event().wait(0.2)
+        hook = proxy._on_vehicle_message
+
+        def run_hook():
+            for msg in messages:
+                hook(None, msg)
+
+        hook_time = min(timeit.repeat(run_hook, number=1, repeat=5))
+        proxy.stop()
+        hook_ns = hook_time / len(messages) * 1e9
+        cpu = hook_ns * args.rate / 1e9 * 100
+        name = "+".join(kinds) or "none"
+        print(f"{name:<16} {hook_ns:>8.0f} {hook_ns / parse_ns:>8.0%} {cpu:>10.3f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import heapq
+import itertools
+import threading
+from typing import Callable
+
+from time_sync import now_ms
+
+
+class CommandScheduler:
+    """
+    Runs callbacks at a given host time on a single worker thread.
+
+    Used to execute swarm commands at a shared timestamp without starting a
+    timer thread per command.
+    """
+
+    def __init__(self) -> None:
+        self._queue = []
+        # Tie breaker so callbacks with the same time keep their order
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def schedule(self, run_at: float, callback: Callable[[], None]) -> None:
+        """
+        Args:
+            run_at (float): Host time in ms since the epoch. Times in the past
+                run immediately.
+            callback (Callable[[], None]): The function to run.
+        """
+        with self._condition:
+            heapq.heappush(self._queue, (run_at, next(self._counter), callback))
+            self._condition.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while True:
+                    if not self._queue:
+                        self._condition.wait()
+                        continue
+                    delay = self._queue[0][0] - now_ms()
+                    if delay <= 0:
+                        break
+                    self._condition.wait(delay / 1000)
+                run_at, _, callback = heapq.heappop(self._queue)
+
+            late = now_ms() - run_at
+            if late > 100:
+                print(f"Scheduled command running {late:.0f} ms late")
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error running scheduled command: {e}")
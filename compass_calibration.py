@@ -0,0 +1,167 @@
+from pymavlink import mavutil
+import queue
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+STATUS_RUNNING = "running"
+STATUS_SUCCESS = "success"
+STATUS_FAILED = "failed"
+STATUS_TIMEOUT = "timeout"
+STATUS_CANCELLED = "cancelled"
+
+
+class CompassCalibrationJob:
+    """
+    Runs an onboard compass calibration in the background.
+
+    MAG_CAL_PROGRESS and MAG_CAL_REPORT messages are picked up through a
+    vehicle message hook, so the job never reads from the link itself and
+    does not compete with the other readers for messages.
+
+    Both messages carry cal_mask, the compasses taking part, and the job
+    finishes once each of them has reported. With retry the autopilot
+    restarts a failed compass, so only a successful report counts as final
+    and a compass that keeps failing ends in a timeout.
+    """
+
+    def __init__(
+        self,
+        vehicle,
+        on_update: Callable[[str, dict], None],
+        timeout: float = 120,
+        max_rate: float = 1,
+        retry: bool = False,
+    ) -> None:
+        """
+        Args:
+            vehicle (mavutil.mavlink_connection): The drone connection.
+            on_update (Callable[[str, dict], None]): Called with the status and
+                the per compass progress. Running updates are limited to
+                max_rate per second, the final update is always delivered.
+            timeout (float): Seconds before the calibration is cancelled.
+            max_rate (float): Maximum progress updates per second.
+            retry (bool): Let the autopilot retry compasses that fail.
+        """
+        self.vehicle = vehicle
+        self.on_update = on_update
+        self.timeout = timeout
+        self.min_interval = 1 / max_rate
+        self.retry = retry
+        self.status = STATUS_RUNNING
+        # Bitmask of the compasses being calibrated, from the first message
+        self.cal_mask = 0
+        # compass_id -> completion percentage
+        self.progress: Dict[int, int] = {}
+        # compass_id -> MAG_CAL_STATUS from the final report
+        self.reports: Dict[int, int] = {}
+        self._messages = queue.Queue()
+        self._cancelled = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self.vehicle.message_hooks.append(self._on_message)
+        self.vehicle.mav.command_long_send(
+            self.vehicle.target_system,
+            self.vehicle.target_component,
+            mavutil.mavlink.MAV_CMD_DO_START_MAG_CAL,
+            0,  # confirmation
+            0,  # magnetometers bitmask (0 for all)
+            1 if self.retry else 0,  # retry on failure
+            1,  # autosave
+            0,  # delay in seconds
+            0,  # autoreboot
+            0,  # reserved, set to 0
+            0,  # reserved, set to 0
+        )
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _on_message(self, mav, msg) -> None:
+        if msg.get_type() in ("MAG_CAL_PROGRESS", "MAG_CAL_REPORT"):
+            self._messages.put(msg)
+
+    def _run(self) -> None:
+        deadline = time.monotonic() + self.timeout
+        last_update = 0
+        try:
+            while True:
+                if self._cancelled.is_set():
+                    self._send_cancel()
+                    self.status = STATUS_CANCELLED
+                    break
+                if time.monotonic() >= deadline:
+                    self._send_cancel()
+                    self.status = STATUS_TIMEOUT
+                    break
+
+                try:
+                    msg = self._messages.get(timeout=0.2)
+                except queue.Empty:
+                    continue
+
+                self.cal_mask |= msg.cal_mask
+                if msg.get_type() == "MAG_CAL_PROGRESS":
+                    self.progress[msg.compass_id] = msg.completion_pct
+                    # A retried compass starts over after its failed report
+                    self.reports.pop(msg.compass_id, None)
+                else:
+                    self.progress[msg.compass_id] = 100
+                    self.reports[msg.compass_id] = msg.cal_status
+                    status = self._final_status()
+                    if status is not None:
+                        self.status = status
+                        break
+
+                now = time.monotonic()
+                if now - last_update >= self.min_interval:
+                    last_update = now
+                    self.on_update(self.status, dict(self.progress))
+        except Exception as e:
+            print(f"Compass calibration failed: {str(e)}")
+            self.status = STATUS_FAILED
+        finally:
+            if self._on_message in self.vehicle.message_hooks:
+                self.vehicle.message_hooks.remove(self._on_message)
+
+        print(f"Compass calibration finished: {self.status}")
+        self.on_update(self.status, dict(self.progress))
+
+    def _final_status(self) -> Optional[str]:
+        """
+        The job result once every compass in cal_mask has a final report,
+        None while any is still running.
+        """
+        succeeded = True
+        for compass_id in range(8):
+            if not self.cal_mask & (1 << compass_id):
+                continue
+            status = self.reports.get(compass_id)
+            if status is None:
+                return None
+            if status != mavutil.mavlink.MAG_CAL_SUCCESS:
+                if self.retry:
+                    return None
+                succeeded = False
+        return STATUS_SUCCESS if succeeded else STATUS_FAILED
+
+    def _send_cancel(self) -> None:
+        self.vehicle.mav.command_long_send(
+            self.vehicle.target_system,
+            self.vehicle.target_component,
+            mavutil.mavlink.MAV_CMD_DO_CANCEL_MAG_CAL,
+            0,  # confirmation
+            0,  # magnetometers bitmask (0 for all)
+            0,  # reserved, set to 0
+            0,  # reserved, set to 0
+            0,  # reserved, set to 0
+            0,  # reserved, set to 0
+            0,  # reserved, set to 0
+            0,  # reserved, set to 0
+        )
@@ -0,0 +1,2 @@
+# Makes pytest put the repository root on sys.path, so tests import the
+# top-level modules the same way main.py does.
@@ -0,0 +1,210 @@
+import math
+import threading
+import time
+from typing import Callable, Optional
+
+from geodesy import horizontal_distance
+
+ON_GROUND = "on_ground"
+TAKING_OFF = "taking_off"
+HOVERING = "hovering"
+MOVING = "moving"
+LANDING = "landing"
+
+EVENT_TAKEOFF_COMPLETE = "takeoff_complete"
+EVENT_TAKEOFF_FAILED = "takeoff_failed"
+EVENT_LANDED = "landed"
+EVENT_TARGET_REACHED = "target_reached"
+EVENT_STATE_CHANGED = "state_changed"
+
+
+class FlightStateTracker:
+    """
+    Tracks the flight phase of the drone from incoming GLOBAL_POSITION_INT
+    messages and the commands sent to it.
+
+    The tracker is attached as a vehicle message hook, so it sees every
+    position message the reader thread receives and needs no polling thread
+    of its own.
+    Transitions are reported through on_event(event, state, args).
+    """
+
+    def __init__(
+        self,
+        on_event: Optional[Callable[[str, str, dict], None]] = None,
+        takeoff_ratio: float = 0.85,
+        landed_altitude: float = 0.3,
+        airborne_altitude: float = 1.0,
+        moving_speed: float = 0.5,
+        hovering_speed: float = 0.3,
+        arrival_radius: float = 1.0,
+        arrival_altitude: float = 0.5,
+        takeoff_timeout: float = 15.0,
+    ) -> None:
+        """
+        Args:
+            on_event (Callable[[str, str, dict], None]): Receives the event name,
+                the new state and event details.
+            takeoff_ratio (float): Fraction of the takeoff altitude that counts
+                as takeoff complete.
+            landed_altitude (float): Relative altitude in meters below which the
+                drone counts as landed.
+            airborne_altitude (float): Relative altitude in meters above which a
+                drone on the ground counts as airborne.
+            moving_speed (float): Ground speed in m/s above which a hovering
+                drone counts as moving.
+            hovering_speed (float): Ground speed in m/s at or below which a
+                moving drone counts as hovering again, or as arrived at its
+                move target. Lower than moving_speed so GPS speed noise
+                around one threshold does not flip the state back and forth.
+            arrival_radius (float): Horizontal distance in meters to the move
+                target that counts as reached.
+            arrival_altitude (float): Vertical distance in meters to the move
+                target that counts as reached.
+            takeoff_timeout (float): Seconds after a takeoff command within
+                which the drone must leave the ground, otherwise the takeoff
+                counts as failed and the state falls back to on_ground.
+        """
+        if hovering_speed > moving_speed:
+            raise ValueError("hovering_speed must not exceed moving_speed")
+        self.on_event = on_event
+        self.takeoff_ratio = takeoff_ratio
+        self.landed_altitude = landed_altitude
+        self.airborne_altitude = airborne_altitude
+        self.moving_speed = moving_speed
+        self.hovering_speed = hovering_speed
+        self.arrival_radius = arrival_radius
+        self.arrival_altitude = arrival_altitude
+        self.takeoff_timeout = takeoff_timeout
+
+        self.state = ON_GROUND
+        self.target_altitude = None
+        self._takeoff_started = None
+        # (lat, lon, alt) of the last move command
+        self.target = None
+        self.position = None
+        self._lock = threading.Lock()
+
+    def attach(self, vehicle) -> None:
+        if self._on_message not in vehicle.message_hooks:
+            vehicle.message_hooks.append(self._on_message)
+
+    def command_takeoff(self, target_altitude: float) -> None:
+        with self._lock:
+            self.target_altitude = target_altitude
+            self.target = None
+            self._takeoff_started = time.monotonic()
+            self._transition(TAKING_OFF)
+
+    def takeoff_failed(self, reason: str) -> None:
+        """
+        Report a takeoff the autopilot rejected, the drone stays on the ground.
+        """
+        with self._lock:
+            if self.state in (ON_GROUND, TAKING_OFF):
+                self._transition(ON_GROUND, EVENT_TAKEOFF_FAILED, {"reason": reason})
+
+    def command_land(self) -> None:
+        with self._lock:
+            self.target = None
+            if self.state != ON_GROUND:
+                self._transition(LANDING)
+
+    def command_move(self, lat: float, lon: float, alt: float) -> None:
+        with self._lock:
+            self.target = (lat, lon, alt)
+            if self.state in (HOVERING, MOVING):
+                self._transition(MOVING)
+
+    def _on_message(self, mav, msg) -> None:
+        if msg.get_type() != "GLOBAL_POSITION_INT":
+            return
+        self.update(
+            msg.lat / 1e7,
+            msg.lon / 1e7,
+            msg.relative_alt / 1000.0,
+            msg.vx / 100.0,
+            msg.vy / 100.0,
+        )
+
+    def update(
+        self, lat: float, lon: float, altitude: float, vx: float, vy: float
+    ) -> None:
+        """
+        Advance the state machine with a new position sample.
+
+        Args:
+            lat (float): Latitude in degrees.
+            lon (float): Longitude in degrees.
+            altitude (float): Relative altitude in meters.
+            vx (float): North velocity in m/s.
+            vy (float): East velocity in m/s.
+        """
+        with self._lock:
+            self.position = (lat, lon, altitude)
+            speed = math.hypot(vx, vy)
+            state = self.state
+
+            if state == ON_GROUND:
+                if altitude > self.airborne_altitude:
+                    self._transition(HOVERING)
+
+            elif state == TAKING_OFF:
+                if altitude >= self.target_altitude * self.takeoff_ratio:
+                    self._transition(
+                        HOVERING, EVENT_TAKEOFF_COMPLETE, {"alt": altitude}
+                    )
+                elif (
+                    altitude <= self.airborne_altitude
+                    and time.monotonic() - self._takeoff_started > self.takeoff_timeout
+                ):
+                    # Never left the ground, e.g. not armed or the ack was lost
+                    self._transition(
+                        ON_GROUND, EVENT_TAKEOFF_FAILED, {"reason": "timeout"}
+                    )
+
+            elif state == LANDING:
+                if altitude <= self.landed_altitude:
+                    self._transition(ON_GROUND, EVENT_LANDED)
+
+            elif altitude <= self.landed_altitude and speed < self.moving_speed:
+                self._transition(ON_GROUND, EVENT_LANDED)
+
+            elif self.target is not None:
+                target_lat, target_lon, target_alt = self.target
+                distance = horizontal_distance(lat, lon, target_lat, target_lon)
+                # Passing through the target at speed is not arriving
+                if (
+                    distance <= self.arrival_radius
+                    and abs(altitude - target_alt) <= self.arrival_altitude
+                    and speed <= self.hovering_speed
+                ):
+                    self.target = None
+                    self._transition(
+                        HOVERING,
+                        EVENT_TARGET_REACHED,
+                        {"lat": lat, "lon": lon, "alt": altitude},
+                    )
+                elif state != MOVING:
+                    self._transition(MOVING)
+
+            elif state == HOVERING and speed > self.moving_speed:
+                self._transition(MOVING)
+
+            elif state == MOVING and speed <= self.hovering_speed:
+                self._transition(HOVERING)
+
+    def _transition(
+        self, state: str, event: str = EVENT_STATE_CHANGED, args: dict = None
+    ) -> None:
+        # Must be called with the lock held
+        if state == self.state and event == EVENT_STATE_CHANGED:
+            return
+        previous = self.state
+        self.state = state
+        print(f"Flight state {previous} -> {state}")
+        if self.on_event is not None:
+            try:
+                self.on_event(event, state, dict(args or {}, previous=previous))
+            except Exception as e:
+                print(f"Error reporting flight event {event}: {e}")
@@ -0,0 +1,174 @@
+"""
+WGS84 <-> local tangent plane conversions.
+
+All functions take scalars or NumPy arrays (broadcast against each other),
+so positions of many points or drones are converted in one call. Angles are
+in degrees, distances in meters and altitudes relative to the frame origin.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+# WGS84 ellipsoid
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = WGS84_A * (1 - WGS84_F)
+WGS84_E2 = WGS84_F * (2 - WGS84_F)
+WGS84_EP2 = WGS84_E2 / (1 - WGS84_E2)
+
+
+def geodetic_to_ecef(lat, lon, alt):
+    """
+    Convert geodetic coordinates to Earth-centred, Earth-fixed coordinates.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: x, y, z in meters.
+    """
+    lat = np.radians(lat)
+    lon = np.radians(lon)
+    sin_lat = np.sin(lat)
+    cos_lat = np.cos(lat)
+    n = WGS84_A / np.sqrt(1 - WGS84_E2 * sin_lat**2)
+    x = (n + alt) * cos_lat * np.cos(lon)
+    y = (n + alt) * cos_lat * np.sin(lon)
+    z = (n * (1 - WGS84_E2) + alt) * sin_lat
+    return x, y, z
+
+
+def ecef_to_geodetic(x, y, z):
+    """
+    Convert ECEF coordinates to geodetic coordinates (Bowring's method,
+    sub-millimetre near the Earth's surface).
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: lat, lon in degrees and
+            altitude above the ellipsoid in meters.
+    """
+    p = np.hypot(x, y)
+    theta = np.arctan2(z * WGS84_A, p * WGS84_B)
+    lat = np.arctan2(
+        z + WGS84_EP2 * WGS84_B * np.sin(theta) ** 3,
+        p - WGS84_E2 * WGS84_A * np.cos(theta) ** 3,
+    )
+    lon = np.arctan2(y, x)
+    sin_lat = np.sin(lat)
+    n = WGS84_A / np.sqrt(1 - WGS84_E2 * sin_lat**2)
+    alt = p / np.cos(lat) - n
+    return np.degrees(lat), np.degrees(lon), alt
+
+
+def local_offsets(lat1, lon1, lat2, lon2):
+    """
+    North and east offsets in meters from point 1 to point 2, using the
+    WGS84 radii of curvature at their mean latitude. Accurate to centimetres
+    over the few kilometres of a flight area and much cheaper than a full
+    frame conversion, so it suits per-message checks.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: north, east in meters.
+    """
+    mean_lat = np.radians((np.asarray(lat1) + lat2) / 2)
+    w2 = 1 - WGS84_E2 * np.sin(mean_lat) ** 2
+    meridional = WGS84_A * (1 - WGS84_E2) / w2**1.5
+    prime_vertical = WGS84_A / np.sqrt(w2)
+    north = np.radians(np.subtract(lat2, lat1)) * meridional
+    east = np.radians(np.subtract(lon2, lon1)) * prime_vertical * np.cos(mean_lat)
+    return north, east
+
+
+def horizontal_distance(lat1, lon1, lat2, lon2):
+    """
+    Horizontal distance in meters between two points, see local_offsets.
+    """
+    north, east = local_offsets(lat1, lon1, lat2, lon2)
+    return np.hypot(north, east)
+
+
+def bearing(lat1, lon1, lat2, lon2):
+    """
+    Bearing in degrees clockwise from north from point 1 to point 2.
+    """
+    north, east = local_offsets(lat1, lon1, lat2, lon2)
+    return np.degrees(np.arctan2(east, north)) % 360
+
+
+class LocalFrame:
+    """
+    Local tangent plane anchored at a home position.
+
+    The ECEF origin and rotation are computed once, after which each
+    conversion is a subtraction and a 3x3 rotation for the whole batch.
+    Use local_frame() to share frames for the same home.
+    """
+
+    def __init__(self, lat: float, lon: float, alt: float = 0.0) -> None:
+        """
+        Args:
+            lat (float): Home latitude in degrees.
+            lon (float): Home longitude in degrees.
+            alt (float): Home altitude in meters. Local altitudes passed to and
+                returned by the frame are measured from the same reference.
+        """
+        self.lat = lat
+        self.lon = lon
+        self.alt = alt
+        self.origin = np.array(geodetic_to_ecef(lat, lon, alt))
+        sin_lat, cos_lat = np.sin(np.radians(lat)), np.cos(np.radians(lat))
+        sin_lon, cos_lon = np.sin(np.radians(lon)), np.cos(np.radians(lon))
+        # Rows are the east, north and up unit vectors in ECEF
+        self.rotation = np.array(
+            [
+                [-sin_lon, cos_lon, 0.0],
+                [-sin_lat * cos_lon, -sin_lat * sin_lon, cos_lat],
+                [cos_lat * cos_lon, cos_lat * sin_lon, sin_lat],
+            ]
+        )
+
+    def to_enu(self, lat, lon, alt=0.0):
+        """
+        Convert geodetic coordinates to east, north, up in meters.
+        """
+        ecef = np.array(geodetic_to_ecef(lat, lon, np.add(alt, self.alt)))
+        delta = ecef - self.origin.reshape((3,) + (1,) * (ecef.ndim - 1))
+        east, north, up = np.tensordot(self.rotation, delta, axes=1)
+        return east, north, up
+
+    def to_ned(self, lat, lon, alt=0.0):
+        """
+        Convert geodetic coordinates to north, east, down in meters.
+        """
+        east, north, up = self.to_enu(lat, lon, alt)
+        return north, east, -up
+
+    def from_enu(self, east, north, up=0.0):
+        """
+        Convert east, north, up in meters to lat, lon in degrees and altitude.
+        """
+        enu = np.array(np.broadcast_arrays(east, north, up), dtype=np.float64)
+        ecef = np.tensordot(self.rotation.T, enu, axes=1)
+        ecef += self.origin.reshape((3,) + (1,) * (ecef.ndim - 1))
+        lat, lon, alt = ecef_to_geodetic(*ecef)
+        return lat, lon, alt - self.alt
+
+    def from_ned(self, north, east, down=0.0):
+        """
+        Convert north, east, down in meters to lat, lon in degrees and altitude.
+        """
+        return self.from_enu(east, north, np.negative(down))
+
+    def offset(self, lat, lon, alt, north, east, down=0.0):
+        """
+        Move geodetic points by north/east/down offsets in meters, e.g. to
+        place formation slots around a leader.
+        """
+        n, e, d = self.to_ned(lat, lon, alt)
+        return self.from_ned(np.add(n, north), np.add(e, east), np.add(d, down))
+
+
+@lru_cache(maxsize=16)
+def local_frame(lat: float, lon: float, alt: float = 0.0) -> LocalFrame:
+    """
+    Return the shared LocalFrame for a home position.
+    """
+    return LocalFrame(lat, lon, alt)
@@ -1,12 +1,17 @@
 import time
 import threading
 import json
+from publisher import PRIORITY_STATE
+from time_sync import AgeStats, ClockOffsetEstimator, now_ms
 
 
-def start_publishing_state(client, helper, topic, state_interval):
+def start_publishing_state(
+    publisher, helper, topic, state_interval, server_clock, age_stats
+):
     def publish_loop():
         while True:
-            publish_state(client, helper, topic)
+            helper.send_timesync()
+            publish_state(publisher, helper, topic, server_clock, age_stats)
             time.sleep(state_interval)
 
     thread = threading.Thread(target=publish_loop)
@@ -14,11 +19,17 @@ def start_publishing_state(client, helper, topic, state_interval):
     thread.start()
 
 
-def publish_state(client, helper, topic):
+def publish_state(
+    publisher,
+    helper,
+    topic,
+    server_clock: ClockOffsetEstimator,
+    age_stats: AgeStats,
+):
     positions = helper.get_current_state()
     if positions == None:
         return
-    latitude, longitude, altitude = positions
+    latitude, longitude, altitude, captured_at = positions
     if latitude is not None and longitude is not None and altitude is not None:
         state_msg = {
             "msg_type": "state_msg",
@@ -26,9 +37,22 @@ def publish_state(client, helper, topic):
                 "lat": latitude,
                 "lon": longitude,
                 "alt": altitude,
+                "flight_state": helper.flight_state.state,
+                # Capture time on the server clock in ms since the epoch
+                "ts": server_clock.to_remote(captured_at),
+                "ts_synced": (
+                    helper.autopilot_clock.is_synced() and server_clock.is_synced()
+                ),
             },
         }
-        client.publish(topic, json.dumps(state_msg))
+        publisher.publish(
+            topic,
+            json.dumps(state_msg),
+            priority=PRIORITY_STATE,
+            coalesce_key="state",
+            # Age at the hand-off to paho, including the time spent queued
+            on_sent=lambda: age_stats.add(now_ms() - captured_at),
+        )
         # print(f"Published state to topic {topic}: {state_msg}")
     else:
         print("Failed to retrieve GPS coordinates, not publishing.")
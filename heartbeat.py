@@ -1,27 +1,39 @@
-import paho.mqtt.client as mqtt
+from publisher import Publisher, PRIORITY_HEARTBEAT
 import time
 import threading
 import json
+from time_sync import AgeStats, now_ms
 
 
 def send_heartbeat(
     heartbeat_interval: int,
-    client: mqtt.Client,
+    publisher: Publisher,
     topic: str,
+    age_stats: AgeStats,
 ):
-    msg = {
-        "msg_type": "heartbeat",
-        "args": {},
-    }
     # send a heartbeat every heartbeat_interval seconds in an infinite loop
     while True:
-        client.publish(topic, json.dumps(msg))
+        # The server echoes "ping" together with its own "server_time" in its
+        # heartbeat, which gives the host to server clock offset. "age" holds
+        # the telemetry age statistics since the previous heartbeat and
+        # "publish_latency" the time messages waited in the publisher queue.
+        msg = {
+            "msg_type": "heartbeat",
+            "args": {
+                "ping": now_ms(),
+                "age": age_stats.snapshot(),
+                "publish_latency": publisher.latency_stats(),
+            },
+        }
+        publisher.publish(topic, json.dumps(msg), priority=PRIORITY_HEARTBEAT)
 
         time.sleep(heartbeat_interval)
 
 
-def start_heartbeat(client: mqtt.Client, heartbeat_interval: int, topic: str):
+def start_heartbeat(
+    publisher: Publisher, heartbeat_interval: int, topic: str, age_stats: AgeStats
+):
     print(f"Starting heartbeat with interval {heartbeat_interval} seconds")
     threading.Thread(
-        target=send_heartbeat, args=(heartbeat_interval, client, topic)
+        target=send_heartbeat, args=(heartbeat_interval, publisher, topic, age_stats)
     ).start()
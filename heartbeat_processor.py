@@ -1,6 +1,7 @@
 import datetime
 import time
 import threading
+from time_sync import ClockOffsetEstimator, now_ms
 
 
 class HeartbeatProcessor:
@@ -15,9 +16,18 @@ class HeartbeatProcessor:
         self.last_heartbeat = None
         self.heartbeat_started = False
         self.is_dead = False
+        # Offset of the server clock from the host clock
+        self.server_clock = ClockOffsetEstimator()
         threading.Thread(target=self.check_alive).start()
 
-    def recieve_heartbeat(self):
+    def recieve_heartbeat(self, args: dict = None):
+        """
+        Args:
+            args (dict): Heartbeat arguments. If the server echoes our "ping"
+                with its "server_time" (both in ms) the clock offset is updated.
+        """
+        if args and "ping" in args and "server_time" in args:
+            self.server_clock.add_sample(args["ping"], args["server_time"], now_ms())
         self.last_heartbeat = datetime.datetime.now()
         self.heartbeat_started = True
         if self.is_dead:
@@ -32,6 +42,7 @@ class HeartbeatProcessor:
     def check_alive(self):
         while True:
             if not self.heartbeat_started:
+                time.sleep(0.1)
                 continue
 
             if not self.is_alive():
@@ -1,44 +1,95 @@
 import paho.mqtt.client as mqtt
 import json
-from process_message import process_message
+from process_message import process_message, send_error, swarm_slice
+from message_registry import ERROR_INVALID_MESSAGE, MessageError
 from logger import log_incoming_message
 from pymavlink_helper import PyMavlinkHelper
 from heartbeat_processor import HeartbeatProcessor
+from publisher import Publisher, PRIORITY_EVENT
+from command_scheduler import CommandScheduler
 import argparse
+import threading
 
 
 LOG_PATH = "logs/"
 PIXHAWK_CONNECTION_STRING = "/dev/serial0"
+# MQTT Configuration
+BROKER = "192.168.1.105"
+PORT = 1883
+# Batched commands for the whole swarm, each client executes its own slice
+SWARM_TOPIC = "swarm/all"
 
 
-def start_client(client_id):
-    helper = PyMavlinkHelper(PIXHAWK_CONNECTION_STRING)
+def start_client(
+    client_id,
+    proxy_endpoints=None,
+    broker=BROKER,
+    port=PORT,
+    connection_string=PIXHAWK_CONNECTION_STRING,
+):
+    helper = PyMavlinkHelper(connection_string, proxy_endpoints)
+    if proxy_endpoints:
+        # Open the link right away so a GCS on the proxy sees the vehicle
+        # before the server sends init_connection
+        threading.Thread(target=helper.connect, daemon=True).start()
     heartbeat_processor = HeartbeatProcessor(die_time=10)
-    # MQTT Configuration
-    BROKER = "192.168.1.105"
-    PORT = 1883
+    scheduler = CommandScheduler()
     CLIENT_ID = "CLIENT_" + str(client_id)
     topic = "drone/" + str(client_id)
 
     def on_message(client: mqtt.Client, userdata, message: mqtt.MQTTMessage) -> None:
-        json_data = json.loads(message.payload.decode())
+        try:
+            json_data = json.loads(message.payload.decode())
+        except ValueError as e:
+            print(f"Received invalid message on {message.topic}: {e}")
+            send_error(publisher, client_id, ERROR_INVALID_MESSAGE, str(e))
+            return
+        if message.topic == SWARM_TOPIC:
+            # The batch holds every drone's command, keep only ours
+            try:
+                json_data = swarm_slice(json_data, client_id)
+            except MessageError as e:
+                print(f"Rejected message on {message.topic}: {e.detail}")
+                message_type = (
+                    json_data.get("msg_type") if isinstance(json_data, dict) else None
+                )
+                send_error(publisher, client_id, e.code, e.detail, message_type)
+                return
+            if json_data is None:
+                return
         print(f"Received message: {json_data}")
         log_incoming_message(json_data, LOG_PATH)
-        process_message(json_data, client, helper, heartbeat_processor, client_id)
+        process_message(
+            json_data,
+            client,
+            publisher,
+            helper,
+            heartbeat_processor,
+            client_id,
+            scheduler,
+        )
 
     def on_connect(client: mqtt.Client, userdata, flags, rc) -> None:
         if rc == 0:
             print(f"Connected to MQTT Broker as {CLIENT_ID}")
-            client.subscribe(topic)
+            client.subscribe([(topic, 0), (SWARM_TOPIC, 0)])
         else:
             print(f"Failed to connect, return code {rc}")
 
     client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, CLIENT_ID)
     client.on_connect = on_connect
     client.on_message = on_message
+    # Bound paho's own queue so a slow broker cannot grow memory without limit
+    client.max_queued_messages_set(100)
+
+    publisher = Publisher(client)
+    # Events (flight events, errors, calibration results) are sent once and
+    # must arrive, telemetry is superseded by the next sample anyway
+    publisher.set_topic_qos("server/" + str(client_id), 1, PRIORITY_EVENT)
+    publisher.start()
 
     keep_alive = 60
-    client.connect(BROKER, PORT, keep_alive)
+    client.connect(broker, port, keep_alive)
 
     # Blocking loop to process network traffic, dispatches callbacks
     client.loop_forever()
@@ -49,6 +100,20 @@ if __name__ == "__main__":
     parser.add_argument(
         "client_id", type=int, help="The unique client ID for the MQTT client (0, 1, 2)"
     )
+    parser.add_argument(
+        "--proxy",
+        action="append",
+        default=None,
+        help="Share the MAVLink stream with a GCS, e.g. udp:192.168.1.10:14550 "
+        "or tcpin:0.0.0.0:5760. Can be given multiple times.",
+    )
+    parser.add_argument("--broker", default=BROKER, help="MQTT broker address")
+    parser.add_argument("--port", type=int, default=PORT, help="MQTT broker port")
+    parser.add_argument(
+        "--connection",
+        default=PIXHAWK_CONNECTION_STRING,
+        help="MAVLink connection string of the autopilot",
+    )
     args = parser.parse_args()
 
-    start_client(args.client_id)
+    start_client(args.client_id, args.proxy, args.broker, args.port, args.connection)
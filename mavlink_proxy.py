@@ -0,0 +1,262 @@
+from pymavlink import mavutil
+import selectors
+import socket
+import threading
+import time
+from typing import Dict, List, Tuple
+
+
+class MavlinkProxy:
+    """
+    Shares the vehicle's MAVLink link with local ground station tools.
+
+    Every message read from the vehicle is forwarded as the raw bytes it
+    arrived with (no re-encoding) to all endpoints, and complete frames
+    received from the endpoints are written back to the vehicle unchanged.
+    Attach it to a MavlinkReader, whose thread runs the downlink hook for
+    every message and whose write lock the uplink shares with the helper.
+
+    Bytes a TCP client cannot take yet are buffered per client and written
+    from the proxy thread. Once a client has max_pending bytes waiting,
+    further frames for it are dropped whole.
+
+    Endpoint formats:
+        udp:<host>:<port>     send to a GCS listening on host:port (Mission Planner, QGC)
+        udpin:<host>:<port>   listen on host:port, reply to the last sender
+        tcpin:<host>:<port>   accept any number of TCP clients on host:port
+    """
+
+    def __init__(self, endpoints: List[str], max_pending: int = 65536) -> None:
+        self.endpoints = endpoints
+        self.max_pending = max_pending
+        self.vehicle = None
+        self._selector = selectors.DefaultSelector()
+        # (socket, peer address or None for connected TCP sockets)
+        self._outputs: List[Tuple[socket.socket, tuple]] = []
+        self._parsers = {}
+        self._running = False
+        # Unsent bytes per TCP client, shared by the reader and proxy threads
+        self._pending: Dict[socket.socket, bytearray] = {}
+        self._pending_lock = threading.Lock()
+        # Written by the reader thread to make the proxy thread watch for
+        # writable clients
+        self._wakeup_recv, self._wakeup_send = socket.socketpair()
+        self._wakeup_recv.setblocking(False)
+        self._wakeup_send.setblocking(False)
+        self._selector.register(
+            self._wakeup_recv, selectors.EVENT_READ, self._read_wakeup
+        )
+
+        self.forwarded_down = 0
+        self.forwarded_up = 0
+        self.dropped = 0
+        self._hook_ns = 0
+
+        for endpoint in endpoints:
+            self._open(endpoint)
+
+    def _open(self, endpoint: str) -> None:
+        try:
+            kind, host, port = endpoint.split(":")
+            address = (host, int(port))
+        except ValueError:
+            raise ValueError(f"Invalid proxy endpoint: {endpoint}")
+
+        if kind == "udp":
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+            sock.bind(("0.0.0.0", 0))
+            self._outputs.append((sock, address))
+            self._selector.register(sock, selectors.EVENT_READ, self._read_udp)
+        elif kind == "udpin":
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+            sock.bind(address)
+            # Peer is unknown until the first datagram arrives
+            self._outputs.append((sock, None))
+            self._selector.register(sock, selectors.EVENT_READ, self._read_udp)
+        elif kind == "tcpin":
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.setblocking(False)
+            sock.bind(address)
+            sock.listen()
+            self._selector.register(sock, selectors.EVENT_READ, self._accept_tcp)
+        else:
+            raise ValueError(f"Unknown proxy endpoint type: {kind}")
+        print(f"MAVLink proxy endpoint {endpoint} opened")
+
+    def attach(self, vehicle) -> None:
+        """
+        Start forwarding traffic of the given vehicle connection. Calling it
+        again after a reconnect moves the proxy to the new connection.
+        """
+        if (
+            self.vehicle is not None
+            and self._on_vehicle_message in self.vehicle.message_hooks
+        ):
+            self.vehicle.message_hooks.remove(self._on_vehicle_message)
+        self.vehicle = vehicle
+        vehicle.message_hooks.append(self._on_vehicle_message)
+
+        if not self._running:
+            self._running = True
+            threading.Thread(target=self._run, daemon=True).start()
+
+    def stop(self) -> None:
+        self._running = False
+        if (
+            self.vehicle is not None
+            and self._on_vehicle_message in self.vehicle.message_hooks
+        ):
+            self.vehicle.message_hooks.remove(self._on_vehicle_message)
+
+    def stats(self) -> dict:
+        """
+        Forwarding counters and the mean time the downlink hook adds to each
+        message read on the control path.
+        """
+        return {
+            "forwarded_down": self.forwarded_down,
+            "forwarded_up": self.forwarded_up,
+            "dropped": self.dropped,
+            "mean_hook_us": (
+                self._hook_ns / self.forwarded_down / 1000 if self.forwarded_down else 0
+            ),
+        }
+
+    def _on_vehicle_message(self, mav, msg) -> None:
+        # Runs on the reader thread for every message, keep it short
+        if msg.get_type() == "BAD_DATA":
+            return
+        start = time.perf_counter_ns()
+        buf = msg.get_msgbuf()
+        for sock, peer in list(self._outputs):
+            try:
+                if peer is not None:
+                    sock.sendto(buf, peer)
+                elif sock.type == socket.SOCK_STREAM:
+                    self._send_tcp(sock, buf)
+                # else a udpin endpoint without a peer yet
+            except OSError:
+                self.dropped += 1
+        self.forwarded_down += 1
+        self._hook_ns += time.perf_counter_ns() - start
+
+    def _send_tcp(self, conn: socket.socket, buf: bytes) -> None:
+        with self._pending_lock:
+            pending = self._pending.get(conn)
+            if pending is None:
+                return  # closed
+            if pending:
+                # Keep frame order, the proxy thread writes the backlog
+                if len(pending) + len(buf) > self.max_pending:
+                    self.dropped += 1
+                else:
+                    pending += buf
+                return
+            try:
+                sent = conn.send(buf)
+            except BlockingIOError:
+                sent = 0
+            if sent == len(buf):
+                return
+            # The rest of a partly sent frame must follow, or the stream
+            # is corrupt for the client
+            pending += buf[sent:]
+        try:
+            self._wakeup_send.send(b"\0")
+        except BlockingIOError:
+            pass  # a wakeup is already pending
+
+    def _run(self) -> None:
+        while self._running:
+            for key, mask in self._selector.select(timeout=0.5):
+                try:
+                    if mask & selectors.EVENT_WRITE:
+                        self._flush_tcp(key.fileobj)
+                    if mask & selectors.EVENT_READ:
+                        key.data(key.fileobj)
+                except OSError as e:
+                    print(f"MAVLink proxy error: {e}")
+                    if key.fileobj in self._pending:
+                        self._close_tcp(key.fileobj)
+
+    def _read_wakeup(self, sock: socket.socket) -> None:
+        try:
+            while sock.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        with self._pending_lock:
+            backlogged = [conn for conn, pending in self._pending.items() if pending]
+        for conn in backlogged:
+            self._selector.modify(
+                conn, selectors.EVENT_READ | selectors.EVENT_WRITE, self._read_tcp
+            )
+
+    def _flush_tcp(self, conn: socket.socket) -> None:
+        with self._pending_lock:
+            pending = self._pending.get(conn)
+            if pending:
+                try:
+                    del pending[: conn.send(pending)]
+                except BlockingIOError:
+                    pass
+            done = not pending
+        if done:
+            self._selector.modify(conn, selectors.EVENT_READ, self._read_tcp)
+
+    def _accept_tcp(self, server: socket.socket) -> None:
+        conn, address = server.accept()
+        conn.setblocking(False)
+        with self._pending_lock:
+            self._pending[conn] = bytearray()
+        self._outputs.append((conn, None))
+        self._selector.register(conn, selectors.EVENT_READ, self._read_tcp)
+        print(f"MAVLink proxy client connected from {address}")
+
+    def _read_tcp(self, conn: socket.socket) -> None:
+        data = conn.recv(4096)
+        if not data:
+            self._close_tcp(conn)
+            return
+        self._forward_up(conn, data)
+
+    def _close_tcp(self, conn: socket.socket) -> None:
+        self._selector.unregister(conn)
+        self._outputs = [output for output in self._outputs if output[0] is not conn]
+        with self._pending_lock:
+            self._pending.pop(conn, None)
+        self._parsers.pop(conn, None)
+        conn.close()
+
+    def _read_udp(self, sock: socket.socket) -> None:
+        data, address = sock.recvfrom(4096)
+        self._outputs = [
+            (s, address if s is sock and p is None else p) for s, p in self._outputs
+        ]
+        self._forward_up(sock, data)
+
+    def _forward_up(self, source: socket.socket, data: bytes) -> None:
+        if self.vehicle is None:
+            return
+        # TCP is a byte stream, so frames are reassembled and each is written
+        # whole. vehicle.write takes the MavlinkReader write lock, which the
+        # helper's own sends hold too, so frames never interleave.
+        parser = self._parsers.get(source)
+        if parser is None:
+            parser = mavutil.mavlink.MAVLink(None)
+            parser.robust_parsing = True
+            self._parsers[source] = parser
+        try:
+            messages = parser.parse_buffer(data) or []
+        except Exception:
+            self.dropped += 1
+            return
+        for msg in messages:
+            if msg.get_type() == "BAD_DATA":
+                self.dropped += 1
+                continue
+            self.vehicle.write(msg.get_msgbuf())
+            self.forwarded_up += 1
@@ -0,0 +1,193 @@
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Callable, List, Optional, Union
+
+
+class MavlinkReader:
+    """
+    Owns every read from a MAVLink connection.
+
+    One thread drains the link continuously, so the connection's
+    message_hooks (proxy, flight state, telemetry history, calibration) run
+    for each message as soon as it arrives and the serial buffer never backs
+    up. Code waiting for a message calls recv_match() on the reader, which
+    takes it from a small per-type buffer instead of reading the port.
+    Messages nobody claims within max_age seconds expire, so a waiter never
+    picks up e.g. a COMMAND_ACK left over from an earlier command.
+
+    Encoding and writing go through one lock, so frames sent by the helper,
+    its background threads and the proxy never interleave on the wire.
+
+    All other attributes are forwarded to the wrapped connection, so the
+    reader can be passed wherever a mavlink_connection is expected.
+    """
+
+    def __init__(self, connection, buffer_size: int = 16, max_age: float = 2.0) -> None:
+        """
+        Args:
+            connection (mavutil.mavfile): An open connection. Start the reader
+                before anything else reads from it.
+            buffer_size (int): Unclaimed messages kept per message type, older
+                ones are dropped.
+            max_age (float): Seconds an unclaimed message stays in the buffer.
+        """
+        self.connection = connection
+        self.buffer_size = buffer_size
+        self.max_age = max_age
+        self.write_lock = threading.RLock()
+        self._buffers = defaultdict(lambda: deque(maxlen=self.buffer_size))
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+
+        # mav.send encodes (sequence number, signing) and calls write; wrap
+        # both so a frame is encoded and written as one step
+        write = connection.write
+        send = connection.mav.send
+
+        def locked_write(buf):
+            with self.write_lock:
+                return write(buf)
+
+        def locked_send(msg, *args, **kwargs):
+            with self.write_lock:
+                return send(msg, *args, **kwargs)
+
+        connection.write = locked_write
+        connection.mav.send = locked_send
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+    def start(self) -> None:
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        self._running = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+        self.connection.close()
+        with self._condition:
+            self._condition.notify_all()
+
+    def _run(self) -> None:
+        while self._running:
+            try:
+                # Hooks run inside recv_match, on this thread
+                msg = self.connection.recv_match(blocking=True, timeout=0.5)
+            except Exception as e:
+                if not self._running:
+                    break
+                print(f"MAVLink read error: {e}")
+                time.sleep(0.1)
+                continue
+            if msg is None or msg.get_type() == "BAD_DATA":
+                continue
+            with self._condition:
+                self._buffers[msg.get_type()].append((time.monotonic(), msg))
+                self._condition.notify_all()
+
+    def recv_match(
+        self,
+        condition: Optional[Callable] = None,
+        type: Union[str, List[str], None] = None,
+        blocking: bool = False,
+        timeout: Optional[float] = None,
+    ):
+        """
+        Take the oldest buffered message matching type and condition, like
+        mavfile.recv_match but without touching the port.
+
+        Args:
+            condition (Callable): Called with each candidate message, only
+                messages it returns True for match. Unlike mavfile.recv_match
+                this is a function, not an expression string.
+            type (str | List[str]): Message type or types, None for any.
+            blocking (bool): Wait for a matching message.
+            timeout (float): Seconds to wait when blocking, None waits forever.
+
+        Returns:
+            The message, or None if none matched in time.
+        """
+        if isinstance(type, str):
+            type = [type]
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while True:
+                msg = self._take(type, condition)
+                if msg is not None or not blocking or not self._running:
+                    return msg
+                if deadline is None:
+                    self._condition.wait()
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                    self._condition.wait(remaining)
+
+    def recv_latest(self, type: str, blocking: bool = True, timeout: float = None):
+        """
+        Take the newest buffered message of a type and discard older ones,
+        for telemetry where only the current value matters.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while True:
+                buffer = self._fresh(type)
+                if buffer:
+                    _, msg = buffer[-1]
+                    buffer.clear()
+                    return msg
+                if not blocking or not self._running:
+                    return None
+                if deadline is None:
+                    self._condition.wait()
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                    self._condition.wait(remaining)
+
+    def discard(self, type: str, condition: Optional[Callable] = None) -> None:
+        """
+        Drop buffered messages of a type, e.g. COMMAND_ACKs for a command
+        about to be sent, so only replies to the new command are matched.
+        """
+        with self._condition:
+            buffer = self._buffers.get(type)
+            if not buffer:
+                return
+            kept = [
+                entry
+                for entry in buffer
+                if condition is not None and not condition(entry[1])
+            ]
+            buffer.clear()
+            buffer.extend(kept)
+
+    def _fresh(self, msg_type: str):
+        # Must be called with the condition held. Entries are in arrival
+        # order, so expired ones are at the left.
+        buffer = self._buffers.get(msg_type)
+        if buffer:
+            expired = time.monotonic() - self.max_age
+            while buffer and buffer[0][0] < expired:
+                buffer.popleft()
+        return buffer
+
+    def _take(self, types: Optional[List[str]], condition: Optional[Callable]):
+        # Must be called with the condition held
+        for msg_type in types if types is not None else list(self._buffers):
+            buffer = self._fresh(msg_type)
+            if not buffer:
+                continue
+            for i, (_, msg) in enumerate(buffer):
+                if condition is None or condition(msg):
+                    del buffer[i]
+                    return msg
+        return None
@@ -0,0 +1,146 @@
+from typing import Any, Callable, Dict, Optional
+
+# Schema value for fields that accept int or float but not bool
+NUMBER = (int, float)
+# Schema value for flags, also accepting the 0/1 integers servers sent
+# before arguments were validated
+FLAG = (bool, int)
+
+# Error codes sent back to the server
+ERROR_INVALID_MESSAGE = "invalid_message"
+ERROR_UNKNOWN_TYPE = "unknown_type"
+ERROR_INVALID_ARGS = "invalid_args"
+ERROR_HANDLER = "handler_error"
+ERROR_NOT_SYNCED = "clock_not_synced"
+
+_REQUIRED = object()
+
+
+class MessageError(ValueError):
+    """
+    Raised when an incoming message cannot be dispatched.
+
+    Attributes:
+        code (str): One of the ERROR_* codes.
+        detail (str): Human readable description.
+    """
+
+    def __init__(self, code: str, detail: str) -> None:
+        super().__init__(f"{code}: {detail}")
+        self.code = code
+        self.detail = detail
+
+
+def compile_schema(schema: Dict[str, Any]) -> Callable[[dict], dict]:
+    """
+    Compile an argument schema into a validator.
+
+    The schema maps each argument name to its type (or tuple of types).
+    A (type, default) list marks the argument as optional. Arguments not in
+    the schema are passed through unchanged.
+
+    Example:
+        compile_schema({"lat": NUMBER, "force": [bool, False]})
+
+    Args:
+        schema (Dict[str, Any]): The argument schema.
+
+    Returns:
+        Callable[[dict], dict]: Returns the arguments with defaults filled in,
+            raises MessageError on missing or mistyped arguments.
+    """
+    # Generate one straight-line function per schema. Values decoded from
+    # JSON are exact int/float/str/bool/dict/list instances, so the type test
+    # is a set membership on __class__, which also keeps bool out of NUMBER.
+    namespace = {"_REQUIRED": _REQUIRED, "_invalid": _invalid}
+    lines = [
+        "def validate(args):",
+        "    if args.__class__ is not dict:",
+        "        _invalid(None, args, None)",
+        "    result = args",
+    ]
+    for i, (name, spec) in enumerate(schema.items()):
+        if isinstance(spec, list):
+            types, default = spec
+        else:
+            types, default = spec, _REQUIRED
+        if not isinstance(types, tuple):
+            types = (types,)
+        allowed = set(types)
+        if default is None:
+            allowed.add(type(None))
+        namespace[f"T{i}"] = frozenset(allowed)
+        namespace[f"N{i}"] = types
+        namespace[f"D{i}"] = default
+        lines.append(f"    v = args.get({name!r}, _REQUIRED)")
+        lines.append(f"    if v.__class__ not in T{i}:")
+        if default is _REQUIRED:
+            lines.append(f"        _invalid({name!r}, v, N{i})")
+        else:
+            lines.append("        if v is _REQUIRED:")
+            lines.append("            if result is args:")
+            lines.append("                result = dict(args)")
+            lines.append(f"            result[{name!r}] = D{i}")
+            lines.append("        else:")
+            lines.append(f"            _invalid({name!r}, v, N{i})")
+    lines.append("    return result")
+    exec("\n".join(lines), namespace)
+    return namespace["validate"]
+
+
+def _invalid(name: Optional[str], value: Any, types: Optional[tuple]) -> None:
+    if name is None:
+        raise MessageError(ERROR_INVALID_ARGS, "args must be an object")
+    if value is _REQUIRED:
+        raise MessageError(ERROR_INVALID_ARGS, f"missing argument {name}")
+    raise MessageError(
+        ERROR_INVALID_ARGS,
+        f"argument {name} must be {'/'.join(t.__name__ for t in types)}",
+    )
+
+
+class MessageRegistry:
+    """
+    Maps message types to handlers and their compiled argument validators.
+    Dispatch is a single dictionary lookup regardless of how many message
+    types are registered.
+    """
+
+    def __init__(self) -> None:
+        self._handlers: Dict[str, tuple] = {}
+
+    def register(self, message_type: str, schema: Optional[Dict[str, Any]] = None):
+        """
+        Decorator registering handler(args, context) for a message type.
+        """
+
+        def decorator(handler: Callable[[dict, Any], None]):
+            self._handlers[message_type] = (handler, compile_schema(schema or {}))
+            return handler
+
+        return decorator
+
+    @property
+    def types(self):
+        return list(self._handlers)
+
+    def dispatch(self, message: dict, context: Any = None) -> None:
+        """
+        Validate a message and run its handler.
+
+        Args:
+            message (dict): The decoded message with msg_type and args.
+            context (Any): Passed to the handler as is.
+
+        Raises:
+            MessageError: If the message is malformed, its type is unknown or
+                its arguments do not match the schema.
+        """
+        if not isinstance(message, dict):
+            raise MessageError(ERROR_INVALID_MESSAGE, "message must be an object")
+        message_type = message.get("msg_type")
+        entry = self._handlers.get(message_type)
+        if entry is None:
+            raise MessageError(ERROR_UNKNOWN_TYPE, f"unknown msg_type {message_type}")
+        handler, validate = entry
+        handler(validate(message.get("args", {})), context)
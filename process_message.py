@@ -3,6 +3,20 @@ from heartbeat import start_heartbeat
 from pymavlink_helper import PyMavlinkHelper
 from heartbeat_processor import HeartbeatProcessor
 from get_current_state import start_publishing_state
+from publisher import Publisher, PRIORITY_EVENT, PRIORITY_LOG
+from compass_calibration import STATUS_RUNNING
+from time_sync import AgeStats
+from command_scheduler import CommandScheduler
+from message_registry import (
+    MessageRegistry,
+    MessageError,
+    FLAG,
+    NUMBER,
+    ERROR_HANDLER,
+    ERROR_INVALID_ARGS,
+    ERROR_INVALID_MESSAGE,
+    ERROR_NOT_SYNCED,
+)
 import time
 
 MESSAGE_TYPES = {
@@ -19,68 +33,305 @@ MESSAGE_TYPES = {
     "accel_compass": "accel_compass",
     "return_to_launch": "return_to_launch",
     "set_home": "set_home",
+    "swarm": "swarm",
 }
 
 
+class MessageContext:
+    """
+    Everything a message handler may need, built once per incoming message.
+    """
+
+    def __init__(
+        self,
+        client: mqtt.Client,
+        publisher: Publisher,
+        helper: PyMavlinkHelper,
+        heartbeat_processor: HeartbeatProcessor,
+        client_id: int,
+        scheduler: CommandScheduler,
+    ) -> None:
+        self.client = client
+        self.publisher = publisher
+        self.helper = helper
+        self.heartbeat_processor = heartbeat_processor
+        self.client_id = client_id
+        self.scheduler = scheduler
+        self.topic = "server/" + str(client_id)
+
+
+# Handlers are registered below with their argument schemas, which are
+# compiled into validators once at import time.
+registry = MessageRegistry()
+
+
 def process_message(
     message: dict,
     client: mqtt.Client,
+    publisher: Publisher,
     helper: PyMavlinkHelper,
     heartbeat_processor: HeartbeatProcessor,
     client_id: int,
+    scheduler: CommandScheduler,
+) -> None:
+    context = MessageContext(
+        client, publisher, helper, heartbeat_processor, client_id, scheduler
+    )
+    message_type = message.get("msg_type") if isinstance(message, dict) else None
+    try:
+        registry.dispatch(message, context)
+    except MessageError as e:
+        print(f"Rejected message {message_type}: {e.detail}")
+        send_error(publisher, client_id, e.code, e.detail, message_type)
+    except Exception as e:
+        print(f"Error handling message {message_type}: {e}")
+        send_error(publisher, client_id, ERROR_HANDLER, str(e), message_type)
+
+
+def send_error(
+    publisher: Publisher,
+    client_id: int,
+    code: str,
+    detail: str,
+    message_type: str = None,
 ) -> None:
-    topic = "server/" + str(client_id)
-    message_type = message["msg_type"]
-    if message_type == MESSAGE_TYPES["init_connection"]:
-        if helper.is_initialized:
-            return
-        
-        helper.initialize()
-
-        heartbeat_interval = message["args"]["heartbeat_interval"] / 1000
-        state_interval = message["args"]["state_interval"] / 1000
-        start_heartbeat(client, heartbeat_interval, topic)
-        start_publishing_state(client, helper, topic, state_interval)
-
-    elif message_type == MESSAGE_TYPES["arm"]:
-        helper.arm(message["args"]["force"])
-
-    elif message_type == MESSAGE_TYPES["disarm"]:
-        helper.disarm(message["args"]["force"])
-
-    elif message_type == MESSAGE_TYPES["takeoff"]:
-        helper.takeoff(message["args"]["altitude"])
-
-    elif message_type == MESSAGE_TYPES["land"]:
-        helper.land()
-
-    elif message_type == MESSAGE_TYPES["move"]:
-        print('Move received')
-        helper.move(
-            message["args"]["lat"],
-            message["args"]["lon"],
-            message["args"]["alt"],
-            message["args"]["vx"],
-            message["args"]["vy"],
-            message["args"]["vz"],
+    """
+    Report a message that could not be processed to the server.
+
+    Args:
+        publisher (Publisher): The outbound publisher.
+        client_id (int): The client ID.
+        code (str): One of the message_registry ERROR_* codes.
+        detail (str): Human readable description.
+        message_type (str): msg_type of the rejected message, if known.
+    """
+    publisher.publish(
+        "server/" + str(client_id),
+        {
+            "msg_type": "error",
+            "args": {"code": code, "detail": detail, "request": message_type},
+        },
+        priority=PRIORITY_EVENT,
+    )
+
+
+@registry.register(
+    MESSAGE_TYPES["init_connection"],
+    {"heartbeat_interval": NUMBER, "state_interval": NUMBER},
+)
+def handle_init_connection(args: dict, context: MessageContext) -> None:
+    helper = context.helper
+    publisher = context.publisher
+    topic = context.topic
+    if helper.is_initialized:
+        return
+
+    helper.initialize()
+
+    heartbeat_interval = args["heartbeat_interval"] / 1000
+    state_interval = args["state_interval"] / 1000
+
+    def on_flight_event(event: str, state: str, args: dict) -> None:
+        publisher.publish(
+            topic,
+            {
+                "msg_type": "flight_event",
+                "args": dict(args, event=event, state=state),
+            },
+            priority=PRIORITY_EVENT,
         )
 
-    elif message_type == MESSAGE_TYPES["set_mode"]:
-        helper.set_mode(message["args"]["mode"])
-
-    elif message_type == MESSAGE_TYPES["heartbeat"]:
-        heartbeat_processor.recieve_heartbeat()
-
-    elif message_type == MESSAGE_TYPES["end_connection"]:
-        client.disconnect()
-        time.sleep(2)
-        exit()
-    
-    elif message_type == MESSAGE_TYPES["set_home"]:
-        helper.set_home(message["args"]["lat"], message["args"]["lon"], message["args"]["alt"])
-        
-    elif message_type == MESSAGE_TYPES["return_to_launch"]:
-        helper.return_to_launch()
-    
-    else:
-        raise ValueError("Invalid message type")
+    helper.flight_state.on_event = on_flight_event
+
+    age_stats = AgeStats()
+    start_heartbeat(publisher, heartbeat_interval, topic, age_stats)
+    start_publishing_state(
+        publisher,
+        helper,
+        topic,
+        state_interval,
+        context.heartbeat_processor.server_clock,
+        age_stats,
+    )
+
+
+@registry.register(MESSAGE_TYPES["arm"], {"force": FLAG})
+def handle_arm(args: dict, context: MessageContext) -> None:
+    context.helper.arm(args["force"])
+
+
+@registry.register(MESSAGE_TYPES["disarm"], {"force": FLAG})
+def handle_disarm(args: dict, context: MessageContext) -> None:
+    context.helper.disarm(args["force"])
+
+
+@registry.register(MESSAGE_TYPES["takeoff"], {"altitude": NUMBER})
+def handle_takeoff(args: dict, context: MessageContext) -> None:
+    context.helper.takeoff(args["altitude"])
+
+
+@registry.register(MESSAGE_TYPES["land"])
+def handle_land(args: dict, context: MessageContext) -> None:
+    context.helper.land()
+
+
+@registry.register(
+    MESSAGE_TYPES["move"],
+    {
+        "lat": NUMBER,
+        "lon": NUMBER,
+        "alt": NUMBER,
+        "vx": [NUMBER, 0],
+        "vy": [NUMBER, 0],
+        "vz": [NUMBER, 0],
+    },
+)
+def handle_move(args: dict, context: MessageContext) -> None:
+    print("Move received")
+    context.helper.move(
+        args["lat"], args["lon"], args["alt"], args["vx"], args["vy"], args["vz"]
+    )
+
+
+@registry.register(MESSAGE_TYPES["set_mode"], {"mode": str})
+def handle_set_mode(args: dict, context: MessageContext) -> None:
+    context.helper.set_mode(args["mode"])
+
+
+@registry.register(MESSAGE_TYPES["heartbeat"])
+def handle_heartbeat(args: dict, context: MessageContext) -> None:
+    context.heartbeat_processor.recieve_heartbeat(args)
+
+
+@registry.register(MESSAGE_TYPES["end_connection"])
+def handle_end_connection(args: dict, context: MessageContext) -> None:
+    context.publisher.stop()
+    context.client.disconnect()
+    time.sleep(2)
+    exit()
+
+
+@registry.register(
+    MESSAGE_TYPES["set_home"], {"lat": NUMBER, "lon": NUMBER, "alt": NUMBER}
+)
+def handle_set_home(args: dict, context: MessageContext) -> None:
+    context.helper.set_home(args["lat"], args["lon"], args["alt"])
+
+
+@registry.register(
+    MESSAGE_TYPES["compass_calibration"],
+    {
+        "action": [str, "start"],
+        "timeout": [NUMBER, 120000],
+        "max_rate": [NUMBER, 1],
+        "retry": [bool, False],
+    },
+)
+def handle_compass_calibration(args: dict, context: MessageContext) -> None:
+    if args["action"] not in ("start", "cancel"):
+        raise MessageError(
+            ERROR_INVALID_ARGS, f"action must be start or cancel, got {args['action']}"
+        )
+    if args["action"] == "cancel":
+        context.helper.cancel_compass_calibration()
+        return
+
+    publisher = context.publisher
+    topic = context.topic
+
+    def on_update(status: str, progress: dict) -> None:
+        # Progress is low priority and only the latest one matters. The
+        # final result jumps ahead of it, so drop any progress still queued.
+        running = status == STATUS_RUNNING
+        if not running:
+            publisher.withdraw("compass_calibration")
+        publisher.publish(
+            topic,
+            {
+                "msg_type": "compass_calibration",
+                "args": {"status": status, "progress": progress},
+            },
+            priority=PRIORITY_LOG if running else PRIORITY_EVENT,
+            coalesce_key="compass_calibration" if running else None,
+        )
+
+    context.helper.start_compass_calibration(
+        on_update,
+        timeout=args["timeout"] / 1000,
+        max_rate=args["max_rate"],
+        retry=args["retry"],
+    )
+
+
+@registry.register(
+    MESSAGE_TYPES["swarm"], {"commands": dict, "execute_at": [NUMBER, None]}
+)
+def handle_swarm(args: dict, context: MessageContext) -> None:
+    # One batched command for all drones, keyed by client id:
+    # {"execute_at": <server time in ms, optional>,
+    #  "commands": {"<client_id>": {"msg_type": ..., "args": {...}}, ...}}
+    command = args["commands"].get(str(context.client_id))
+    if (
+        not isinstance(command, dict)
+        or command.get("msg_type") == MESSAGE_TYPES["swarm"]
+    ):
+        return
+
+    def execute() -> None:
+        process_message(
+            command,
+            context.client,
+            context.publisher,
+            context.helper,
+            context.heartbeat_processor,
+            context.client_id,
+            context.scheduler,
+        )
+
+    if args["execute_at"] is None:
+        execute()
+        return
+
+    server_clock = context.heartbeat_processor.server_clock
+    if not server_clock.is_synced():
+        # Without the offset execute_at would be read as host time, which
+        # may be off by seconds. The server retries after the next heartbeat.
+        raise MessageError(
+            ERROR_NOT_SYNCED, "execute_at given before the server clock is synced"
+        )
+    context.scheduler.schedule(server_clock.to_local(args["execute_at"]), execute)
+
+
+def swarm_slice(message, client_id: int):
+    """
+    Reduce a swarm/all batch to the command of this client, so only that
+    is logged and processed.
+
+    Returns:
+        dict: The batch with only this client's command, the message
+            unchanged if its args are malformed (the swarm validator rejects
+            it) or None if there is no command for this client.
+
+    Raises:
+        MessageError: If the message is not a swarm batch. Anything else on
+            the shared topic would be run by every drone at once.
+    """
+    if not isinstance(message, dict) or message.get("msg_type") != MESSAGE_TYPES[
+        "swarm"
+    ]:
+        raise MessageError(
+            ERROR_INVALID_MESSAGE, "only swarm messages are accepted on swarm/all"
+        )
+    args = message.get("args")
+    commands = args.get("commands") if isinstance(args, dict) else None
+    if not isinstance(commands, dict):
+        return message
+    key = str(client_id)
+    if key not in commands:
+        return None
+    return dict(message, args=dict(args, commands={key: commands[key]}))
+
+
+@registry.register(MESSAGE_TYPES["return_to_launch"])
+def handle_return_to_launch(args: dict, context: MessageContext) -> None:
+    context.helper.return_to_launch()
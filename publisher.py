@@ -0,0 +1,329 @@
+import paho.mqtt.client as mqtt
+import threading
+import time
+import json
+from collections import deque
+from typing import Callable, Dict, Optional, Tuple
+
+# Message classes in priority order, lower value is published first.
+PRIORITY_HEARTBEAT = 0
+PRIORITY_EVENT = 1
+PRIORITY_STATE = 2
+PRIORITY_LOG = 3
+
+PRIORITIES = (PRIORITY_HEARTBEAT, PRIORITY_EVENT, PRIORITY_STATE, PRIORITY_LOG)
+PRIORITY_NAMES = {
+    PRIORITY_HEARTBEAT: "heartbeat",
+    PRIORITY_EVENT: "event",
+    PRIORITY_STATE: "state",
+    PRIORITY_LOG: "log",
+}
+
+# What to do when the buffer is full and the incoming message is not more
+# important than anything queued.
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+
+
+class _Entry:
+    __slots__ = (
+        "topic",
+        "payload",
+        "qos",
+        "priority",
+        "coalesce_key",
+        "queued_at",
+        "on_sent",
+    )
+
+    def __init__(self, topic, payload, qos, priority, coalesce_key, on_sent):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.priority = priority
+        self.coalesce_key = coalesce_key
+        self.queued_at = time.monotonic()
+        self.on_sent = on_sent
+
+
+class Publisher:
+    """
+    Single outbound stage for every message the client sends to the server.
+
+    Producer threads (heartbeat, state, callbacks) only enqueue; one worker
+    thread hands messages to paho in priority order. The buffer is bounded,
+    superseded messages sharing a coalesce key are replaced in place and
+    messages older than their class deadline are dropped instead of sent.
+    """
+
+    def __init__(
+        self,
+        client: mqtt.Client,
+        max_size: int = 64,
+        drop_policy: str = DROP_OLDEST,
+        max_age: Optional[Dict[int, float]] = None,
+    ) -> None:
+        """
+        Args:
+            client (mqtt.Client): The connected MQTT client.
+            max_size (int): Maximum number of queued messages over all classes.
+            drop_policy (str): DROP_OLDEST or DROP_NEWEST, applied when the
+                buffer is full and no less important message can be evicted.
+            max_age (dict): Seconds a message of a given priority may wait
+                before it is considered stale and dropped.
+        """
+        if drop_policy not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"Invalid drop policy: {drop_policy}")
+        self.client = client
+        self.max_size = max_size
+        self.drop_policy = drop_policy
+        self.max_age = {
+            PRIORITY_HEARTBEAT: 5.0,
+            PRIORITY_EVENT: 10.0,
+            PRIORITY_STATE: 2.0,
+            PRIORITY_LOG: 30.0,
+        }
+        if max_age:
+            self.max_age.update(max_age)
+        # (topic pattern, priority or None) -> QoS, see set_topic_qos
+        self.topic_qos: Dict[Tuple[str, Optional[int]], int] = {}
+        self.default_qos = 0
+        self._qos_cache: Dict[Tuple[str, int], int] = {}
+
+        self._queues = {priority: deque() for priority in PRIORITIES}
+        self._coalesced: Dict[str, _Entry] = {}
+        self._size = 0
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+
+        # Guarded by _condition
+        self.stats = {"published": 0, "dropped": 0, "coalesced": 0, "stale": 0}
+        # Time from queueing to the hand-off to paho per priority, in seconds:
+        # [count, total, max] since the last latency_stats() call
+        self._latency = {priority: [0, 0.0, 0.0] for priority in PRIORITIES}
+
+    def set_topic_qos(
+        self, topic: str, qos: int, priority: Optional[int] = None
+    ) -> None:
+        """
+        Set the QoS used for a topic. Subscription wildcards are allowed.
+
+        Args:
+            topic (str): Topic or subscription pattern.
+            qos (int): 0, 1 or 2.
+            priority (int): Only apply to messages of this PRIORITY_* class,
+                for when one topic carries messages of several classes.
+        """
+        if qos not in (0, 1, 2):
+            raise ValueError(f"Invalid QoS: {qos}")
+        if priority is not None and priority not in PRIORITIES:
+            raise ValueError(f"Invalid priority: {priority}")
+        with self._condition:
+            self.topic_qos[(topic, priority)] = qos
+            self._qos_cache.clear()
+
+    def qos_for(self, topic: str, priority: int = PRIORITY_LOG) -> int:
+        """
+        QoS for a message, class specific settings win over topic wide ones
+        and exact topics over wildcards.
+        """
+        qos = self._qos_cache.get((topic, priority))
+        if qos is not None:
+            return qos
+        with self._condition:
+            qos = self._lookup_qos(topic, priority)
+            self._qos_cache[(topic, priority)] = qos
+        return qos
+
+    def _lookup_qos(self, topic: str, priority: int) -> int:
+        for key in ((topic, priority), (topic, None)):
+            if key in self.topic_qos:
+                return self.topic_qos[key]
+        for wanted in (priority, None):
+            for (pattern, pattern_priority), qos in self.topic_qos.items():
+                if pattern_priority == wanted and mqtt.topic_matches_sub(
+                    pattern, topic
+                ):
+                    return qos
+        return self.default_qos
+
+    def latency_stats(self) -> Dict[str, dict]:
+        """
+        Return queueing latency per class since the previous call and reset it.
+
+        Returns:
+            dict: Class name -> {"count", "mean", "max"}, latencies in ms.
+        """
+        with self._condition:
+            latency = self._latency
+            self._latency = {priority: [0, 0.0, 0.0] for priority in PRIORITIES}
+        return {
+            PRIORITY_NAMES[priority]: {
+                "count": count,
+                "mean": round(total / count * 1000, 1) if count else None,
+                "max": round(peak * 1000, 1) if count else None,
+            }
+            for priority, (count, total, peak) in latency.items()
+        }
+
+    def start(self) -> None:
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+
+    def publish(
+        self,
+        topic: str,
+        message,
+        priority: int = PRIORITY_LOG,
+        coalesce_key: Optional[str] = None,
+        qos: Optional[int] = None,
+        on_sent: Optional[Callable[[], None]] = None,
+    ) -> bool:
+        """
+        Queue a message for publishing. Never blocks on the network.
+
+        Args:
+            topic (str): The MQTT topic.
+            message (dict | str | bytes): The payload, dicts are JSON encoded.
+            priority (int): One of the PRIORITY_* classes.
+            coalesce_key (str): If a queued message has the same key its
+                payload is replaced by this one and keeps its position.
+            qos (int): Overrides the QoS set with set_topic_qos.
+            on_sent (Callable[[], None]): Called on the worker thread once
+                the message is handed to paho, not for dropped messages.
+
+        Returns:
+            bool: False if the message was dropped.
+        """
+        if priority not in self._queues:
+            raise ValueError(f"Invalid priority: {priority}")
+        if isinstance(message, dict):
+            message = json.dumps(message)
+        if qos is None:
+            qos = self.qos_for(topic, priority)
+
+        with self._condition:
+            if coalesce_key is not None:
+                queued = self._coalesced.get(coalesce_key)
+                if queued is not None:
+                    queued.topic = topic
+                    queued.payload = message
+                    queued.qos = qos
+                    queued.on_sent = on_sent
+                    # Age and latency count from the newest payload
+                    queued.queued_at = time.monotonic()
+                    self.stats["coalesced"] += 1
+                    return True
+
+            if self._size >= self.max_size and not self._make_room(priority):
+                self.stats["dropped"] += 1
+                return False
+
+            entry = _Entry(topic, message, qos, priority, coalesce_key, on_sent)
+            self._queues[priority].append(entry)
+            if coalesce_key is not None:
+                self._coalesced[coalesce_key] = entry
+            self._size += 1
+            self._condition.notify()
+        return True
+
+    def withdraw(self, coalesce_key: str) -> bool:
+        """
+        Remove the queued message with the given coalesce key, e.g. a
+        progress update made obsolete by a final result sent in a more
+        important class.
+
+        Returns:
+            bool: False if no message with that key was queued.
+        """
+        with self._condition:
+            entry = self._coalesced.get(coalesce_key)
+            if entry is None:
+                return False
+            self._queues[entry.priority].remove(entry)
+            self._discard(entry)
+        return True
+
+    def _make_room(self, priority: int) -> bool:
+        """
+        Evict one queued message to fit a new one of the given priority.
+        Must be called with the condition held.
+        """
+        for candidate in reversed(PRIORITIES):
+            if candidate < priority:
+                break
+            queue = self._queues[candidate]
+            if not queue:
+                continue
+            if candidate == priority and self.drop_policy == DROP_NEWEST:
+                return False
+            self._discard(queue.popleft())
+            self.stats["dropped"] += 1
+            return True
+        return False
+
+    def _discard(self, entry: _Entry) -> None:
+        self._size -= 1
+        if (
+            entry.coalesce_key is not None
+            and self._coalesced.get(entry.coalesce_key) is entry
+        ):
+            del self._coalesced[entry.coalesce_key]
+
+    def _next_entry(self) -> Optional[_Entry]:
+        with self._condition:
+            while self._running and self._size == 0:
+                self._condition.wait()
+            if not self._running:
+                return None
+            now = time.monotonic()
+            for priority in PRIORITIES:
+                queue = self._queues[priority]
+                while queue:
+                    entry = queue.popleft()
+                    self._discard(entry)
+                    if now - entry.queued_at > self.max_age[priority]:
+                        self.stats["stale"] += 1
+                        continue
+                    return entry
+        return None
+
+    def _run(self) -> None:
+        while self._running:
+            entry = self._next_entry()
+            if entry is None:
+                continue
+            try:
+                info = self.client.publish(entry.topic, entry.payload, qos=entry.qos)
+                # Paho's own queue is full or we are disconnected. Do not
+                # retry, fresher data will follow.
+                published = info.rc == mqtt.MQTT_ERR_SUCCESS
+            except Exception as e:
+                published = False
+                print(f"Failed to publish to {entry.topic}: {e}")
+            latency = time.monotonic() - entry.queued_at
+
+            if published and entry.on_sent is not None:
+                try:
+                    entry.on_sent()
+                except Exception as e:
+                    print(f"Error in on_sent for {entry.topic}: {e}")
+
+            with self._condition:
+                if published:
+                    self.stats["published"] += 1
+                    counters = self._latency[entry.priority]
+                    counters[0] += 1
+                    counters[1] += latency
+                    counters[2] = max(counters[2], latency)
+                else:
+                    self.stats["dropped"] += 1
@@ -1,12 +1,20 @@
 from pymavlink import mavutil
 import time
 from pymavlink_utils import (
+    discard_acks,
+    request_attitude,
     request_global_position,
     set_drone_mode,
     try_recv_match,
     send_position_target_global_int,
 )
-from typing import List, Tuple
+from mavlink_proxy import MavlinkProxy
+from mavlink_reader import MavlinkReader
+from compass_calibration import CompassCalibrationJob
+from flight_state import FlightStateTracker
+from time_sync import ClockOffsetEstimator, now_ms
+from telemetry_history import TelemetryHistory
+from typing import Callable, List, Optional, Tuple
 import threading
 
 
@@ -15,9 +23,56 @@ class PyMavlinkHelper:
     PyMavlink environment helper class that provides a high-level interface to interact with the environment.
     """
 
-    def __init__(self, connection_string: str) -> None:
+    def __init__(
+        self, connection_string: str, proxy_endpoints: Optional[List[str]] = None
+    ) -> None:
+        """
+        Args:
+            connection_string (str): The autopilot connection, e.g. /dev/serial0.
+            proxy_endpoints (List[str]): Optional local endpoints the raw MAVLink
+                stream is shared with, see MavlinkProxy for the formats.
+        """
         self.connection_string = connection_string
         self.is_initialized = False
+        # MavlinkReader around the autopilot connection, set by connect()
+        self.vehicle: Optional[MavlinkReader] = None
+        self._connect_lock = threading.Lock()
+        self.proxy = MavlinkProxy(proxy_endpoints) if proxy_endpoints else None
+        self.compass_calibration: Optional[CompassCalibrationJob] = None
+        # Set flight_state.on_event to receive takeoff/landing/arrival events
+        self.flight_state = FlightStateTracker()
+        # Offset of the autopilot boot clock from the host clock, from TIMESYNC
+        self.autopilot_clock = ClockOffsetEstimator()
+        self.timesync_interval = 5
+        self._last_timesync = 0
+        self._pending_timesync = set()
+        # GLOBAL_POSITION_INT and ATTITUDE rate requested in initialize()
+        self.telemetry_rate = 1
+        # Last 30 s of position, velocity and attitude for on-board estimation
+        self.history = TelemetryHistory(seconds=30, rate=self.telemetry_rate)
+
+    def connect(self) -> None:
+        """
+        Open the autopilot link and start the reader thread, which from then
+        on runs the message hooks and feeds the proxy. Does nothing if the
+        link is already open.
+        """
+        with self._connect_lock:
+            if self.vehicle is not None:
+                return
+            connection = mavutil.mavlink_connection(
+                self.connection_string, baud=57600
+            )
+            connection.wait_heartbeat()
+            vehicle = MavlinkReader(connection)
+            self.history.attach(vehicle)
+            self.flight_state.attach(vehicle)
+            vehicle.message_hooks.append(self._on_timesync)
+            if self.proxy is not None:
+                self.proxy.attach(vehicle)
+            vehicle.start()
+            self.vehicle = vehicle
+            print("Connected to Pixhawk")
 
     def initialize(self) -> None:
         """
@@ -25,14 +80,12 @@ class PyMavlinkHelper:
         """
         if self.is_initialized:
             return
-        vehicle = mavutil.mavlink_connection(self.connection_string, baud=57600)
-        vehicle.wait_heartbeat()
-        request_global_position(vehicle, rate=1)
-        self.vehicle = vehicle
+        self.connect()
+        request_global_position(self.vehicle, rate=self.telemetry_rate)
+        request_attitude(self.vehicle, rate=self.telemetry_rate)
         self.is_initialized = True
-        print("Connected to Pixhawk")
         time.sleep(0.5)
-        set_drone_mode(vehicle, "GUIDED")
+        set_drone_mode(self.vehicle, "GUIDED")
         time.sleep(0.5)
         print("Environment initialized")
 
@@ -42,6 +95,7 @@ class PyMavlinkHelper:
         """
 
         try:
+            discard_acks(self.vehicle, mavutil.mavlink.MAV_CMD_COMPONENT_ARM_DISARM)
             self.vehicle.mav.command_long_send(
                 self.vehicle.target_system,
                 self.vehicle.target_component,
@@ -56,7 +110,12 @@ class PyMavlinkHelper:
                 0,
             )
 
-            ack_msg = try_recv_match(self.vehicle, message_name="COMMAND_ACK")
+            ack_msg = try_recv_match(
+                self.vehicle,
+                message_name="COMMAND_ACK",
+                condition=lambda msg: msg.command
+                == mavutil.mavlink.MAV_CMD_COMPONENT_ARM_DISARM,
+            )
             if (
                 ack_msg != None
                 and ack_msg.result == mavutil.mavlink.MAV_RESULT_ACCEPTED
@@ -75,6 +134,7 @@ class PyMavlinkHelper:
         Disarm the vehicle.
         """
         try:
+            discard_acks(self.vehicle, mavutil.mavlink.MAV_CMD_COMPONENT_ARM_DISARM)
             self.vehicle.mav.command_long_send(
                 self.vehicle.target_system,
                 self.vehicle.target_component,
@@ -88,7 +148,12 @@ class PyMavlinkHelper:
                 0,
                 0,
             )
-            ack_msg = try_recv_match(self.vehicle, message_name="COMMAND_ACK")
+            ack_msg = try_recv_match(
+                self.vehicle,
+                message_name="COMMAND_ACK",
+                condition=lambda msg: msg.command
+                == mavutil.mavlink.MAV_CMD_COMPONENT_ARM_DISARM,
+            )
             if (
                 ack_msg != None
                 and ack_msg.result == mavutil.mavlink.MAV_RESULT_ACCEPTED
@@ -107,23 +172,12 @@ class PyMavlinkHelper:
             target_altitude (float): The altitude to reach in meters. Must be greater than 0.
         """
 
-        def monitor_altitude():
-            while True:
-                msg = try_recv_match(self.vehicle, message_name="GLOBAL_POSITION_INT")
-                if msg == None:
-                    continue
-                altitude = msg.relative_alt / 1000.0  # altitude in meters
-                print(f"Altitude: {altitude}")
-                if altitude >= target_altitude * 0.85:  # 85% of target altitude
-                    print("Reached target altitude")
-                    break
-                time.sleep(1)  # Wait before checking altitude again
-
         try:
             if target_altitude <= 0:
                 return  # Do not proceed with takeoff if altitude is 0 or less
             print("Taking off...")
 
+            discard_acks(self.vehicle, mavutil.mavlink.MAV_CMD_NAV_TAKEOFF)
             self.vehicle.mav.command_long_send(
                 self.vehicle.target_system,
                 self.vehicle.target_component,
@@ -137,10 +191,23 @@ class PyMavlinkHelper:
                 0,
                 target_altitude,
             )
-
-            # Start the altitude monitoring in a separate thread
-            altitude_thread = threading.Thread(target=monitor_altitude)
-            altitude_thread.start()
+            ack_msg = try_recv_match(
+                self.vehicle,
+                message_name="COMMAND_ACK",
+                retries=3,
+                condition=lambda msg: msg.command
+                == mavutil.mavlink.MAV_CMD_NAV_TAKEOFF,
+            )
+            if ack_msg != None and ack_msg.result not in (
+                mavutil.mavlink.MAV_RESULT_ACCEPTED,
+                mavutil.mavlink.MAV_RESULT_IN_PROGRESS,
+            ):
+                print(f"Takeoff rejected with result {ack_msg.result}")
+                self.flight_state.takeoff_failed("rejected")
+                return
+            # Without an ack the takeoff is assumed to be running, the
+            # tracker falls back to on_ground if the drone never climbs
+            self.flight_state.command_takeoff(target_altitude)
 
         except Exception as e:
             print(f"Error during takeoff: {e}")
@@ -149,21 +216,6 @@ class PyMavlinkHelper:
         """
         Initiate the landing process of the drone.
         """
-
-        def monitor_landing():
-            while True:
-                msg = try_recv_match(self.vehicle, message_name="GLOBAL_POSITION_INT")
-                if msg == None:
-                    continue
-                altitude = msg.relative_alt / 1000.0  # altitude in meters
-                print(f"Drone Altitude: {altitude}")
-                if (
-                    altitude <= 0.3
-                ):  # Assume landed if altitude is less than or equal to 0.3 meters
-                    print("Drone Landed")
-                    break
-                time.sleep(1)
-
         try:
             print("Landing drone...")
             self.vehicle.mav.command_long_send(
@@ -179,11 +231,7 @@ class PyMavlinkHelper:
                 0,
                 0,
             )
-            time.sleep(0.2)
-
-            # Start the landing monitoring in a separate thread
-            landing_thread = threading.Thread(target=monitor_landing)
-            landing_thread.start()
+            self.flight_state.command_land()
 
         except Exception as e:
             print(f"Error during landing: {e}")
@@ -207,6 +255,7 @@ class PyMavlinkHelper:
         try:
             # Send position target
             send_position_target_global_int(self.vehicle, lat, lon, alt, 0, 0, 0)
+            self.flight_state.command_move(lat, lon, alt)
 
             print(f"Drone moving to {lat, lon, alt} with velocity 0, 0, 0")
 
@@ -216,54 +265,94 @@ class PyMavlinkHelper:
     def set_mode(self, mode: str) -> None:
         set_drone_mode(self.vehicle, mode)
 
-    def get_current_state(self) -> Tuple[float, float, float]:
-        msg = try_recv_match(self.vehicle, message_name="GLOBAL_POSITION_INT")
+    def get_current_state(self) -> Tuple[float, float, float, float]:
+        """
+        Read the newest position of the drone.
+
+        Returns:
+            Tuple[float, float, float, float]: Latitude, longitude, relative
+                altitude and the capture time on the host clock in ms. The
+                capture time falls back to the receive time until the
+                autopilot clock offset is known.
+        """
+        # The reader keeps the link drained, take the freshest sample rather
+        # than the oldest one waiting in its buffer
+        msg = self.vehicle.recv_latest("GLOBAL_POSITION_INT", timeout=2)
         if msg == None:
             return None
         latitude = msg.lat / 1e7
         longtitude = msg.lon / 1e7
         altitude = msg.relative_alt / 1000.0
+        if self.autopilot_clock.is_synced():
+            captured_at = self.autopilot_clock.to_local(msg.time_boot_ms)
+        else:
+            captured_at = now_ms()
 
-        return latitude, longtitude, altitude
+        return latitude, longtitude, altitude, captured_at
 
-    def start_compass_calibration(self) -> None:
+    def send_timesync(self) -> None:
         """
-        Start compass calibration for the drone.
+        Send a TIMESYNC request to the autopilot if the last one is older than
+        timesync_interval. The reply is handled by a message hook.
         """
-        print("Starting compass calibration...")
+        if time.monotonic() - self._last_timesync < self.timesync_interval:
+            return
+        self._last_timesync = time.monotonic()
+        ts1 = time.time_ns()
+        # Keep only the latest few requests, replies to older ones are stale
+        if len(self._pending_timesync) > 4:
+            self._pending_timesync.clear()
+        self._pending_timesync.add(ts1)
+        self.vehicle.mav.timesync_send(0, ts1)
+
+    def _on_timesync(self, mav, msg) -> None:
+        # tc1 == 0 is a request from the autopilot, not a reply to ours
+        if msg.get_type() != "TIMESYNC" or msg.tc1 == 0:
+            return
+        if msg.ts1 not in self._pending_timesync:
+            return
+        self._pending_timesync.discard(msg.ts1)
+        # Both fields are in nanoseconds, tc1 on the autopilot boot clock
+        self.autopilot_clock.add_sample(msg.ts1 / 1e6, msg.tc1 / 1e6, now_ms())
 
-        try:
-            # Send MAV_CMD_DO_START_MAG_CAL command
-            self.vehicle.mav.command_long_send(
-                self.vehicle.target_system,
-                self.vehicle.target_component,
-                mavutil.mavlink.MAV_CMD_DO_START_MAG_CAL,
-                0,  # confirmation
-                0,  # autopilot mag device ID (0 for all)
-                1,  # autopilot mag orientation
-                1,  # internal mag orientation
-                0,  # external mag 1 orientation (0 for default)
-                0,  # external mag 2 orientation (0 for default)
-                0,  # external mag 3 orientation (0 for default)
-                0,  # reserved, set to 0
-            )
+    def start_compass_calibration(
+        self,
+        on_update: Callable[[str, dict], None],
+        timeout: float = 120,
+        max_rate: float = 1,
+        retry: bool = False,
+    ) -> CompassCalibrationJob:
+        """
+        Start compass calibration for the drone in the background.
 
-            # Monitor the calibration process
-            while True:
-                msg = self.vehicle.recv_match(
-                    type=["MAG_CAL_PROGRESS", "MAG_CAL_REPORT"], blocking=True
-                )
-                if msg:
-                    print(msg)
-                    if (
-                        msg.get_type() == "MAG_CAL_REPORT" and msg.cal_status == 5
-                    ):  # 5 indicates calibration completed
-                        print("Compass calibration completed successfully!")
-                        break
-                time.sleep(0.5)
+        Args:
+            on_update (Callable[[str, dict], None]): Receives the calibration
+                status and the completion percentage of each compass.
+            timeout (float): Seconds before the calibration is cancelled.
+            max_rate (float): Maximum progress updates per second.
+            retry (bool): Let the autopilot retry compasses that fail.
+
+        Returns:
+            CompassCalibrationJob: The running job.
+
+        Raises:
+            RuntimeError: If the vehicle is not connected or a calibration is
+                already running.
+        """
+        if self.vehicle is None:
+            raise RuntimeError("Vehicle is not connected, send init_connection first")
+        if (
+            self.compass_calibration is not None
+            and self.compass_calibration.is_running()
+        ):
+            raise RuntimeError("Compass calibration already running")
 
-        except Exception as e:
-            print(f"Compass calibration failed: {str(e)}")
+        print("Starting compass calibration...")
+        # Errors propagate so the dispatcher reports them to the server
+        job = CompassCalibrationJob(self.vehicle, on_update, timeout, max_rate, retry)
+        job.start()
+        self.compass_calibration = job
+        return job
 
     def cancel_compass_calibration(self) -> None:
         """
@@ -271,6 +360,14 @@ class PyMavlinkHelper:
         """
         print("Cancelling compass calibration...")
 
+        if (
+            self.compass_calibration is not None
+            and self.compass_calibration.is_running()
+        ):
+            # The job sends the cancel command and reports the result
+            self.compass_calibration.cancel()
+            return
+
         try:
             # Send MAV_CMD_DO_CANCEL_MAG_CAL command
             self.vehicle.mav.command_long_send(
@@ -284,6 +381,7 @@ class PyMavlinkHelper:
                 0,  # Reserved, set to 0
                 0,  # Reserved, set to 0
                 0,  # Reserved, set to 0
+                0,  # Reserved, set to 0
             )
 
             print("Compass calibration canceled.")
@@ -313,6 +411,8 @@ class PyMavlinkHelper:
 
             # Optionally, you might need to close the connection and reopen it after reboot
             self.vehicle.close()
+            self.vehicle = None
+            self.is_initialized = False
             print("Drone rebooted. Reconnecting...")
             time.sleep(10)  # Wait for the drone to reboot and reconnect
             self.initialize()  # Reinitialize connection
@@ -1,9 +1,15 @@
 from pymavlink import mavutil
 import time
+from mavlink_reader import MavlinkReader
 
 
 def try_recv_match(
-    vehicle, message_name: str, retries: int = 10, timeout: float = 1, blocking=True
+    vehicle,
+    message_name: str,
+    retries: int = 10,
+    timeout: float = 1,
+    blocking=True,
+    condition=None,
 ):
     """
     Tries to receive a MAVLink message by matching the message name.
@@ -13,6 +19,8 @@ def try_recv_match(
         message_name: The name of the MAVLink message to match.
         retries: Number of times to retry if no message is received.
         timeout: Timeout for each recv_match attempt in seconds.
+        condition: Only match messages this returns True for. A function
+            for a MavlinkReader, an expression string for a raw connection.
 
     Returns:
         The matched MAVLink message if successful, None otherwise.
@@ -23,7 +31,10 @@ def try_recv_match(
         try:
             # Try to receive the matched message
             msg = vehicle.recv_match(
-                type=message_name, blocking=blocking, timeout=timeout
+                condition=condition,
+                type=message_name,
+                blocking=blocking,
+                timeout=timeout,
             )
             if msg != None:
                 # print(f"Received {message_name} message.")
@@ -41,6 +52,20 @@ def try_recv_match(
     return None  # Return None if all attempts fail
 
 
+def discard_acks(vehicle, command: int) -> None:
+    """
+    Drop buffered COMMAND_ACKs for a command before sending it again, so a
+    late ack to an earlier attempt is not taken as the reply. Only a
+    MavlinkReader buffers messages, raw connections need nothing.
+
+    Args:
+        vehicle: The vehicle object.
+        command: The MAV_CMD the ack belongs to.
+    """
+    if isinstance(vehicle, MavlinkReader):
+        vehicle.discard("COMMAND_ACK", lambda msg: msg.command == command)
+
+
 def request_global_position(drone, rate=1):
     """
     Requests the GLOBAL_POSITION_INT data stream at a specified rate.
@@ -59,6 +84,24 @@ def request_global_position(drone, rate=1):
     print(f"Requested GLOBAL_POSITION_INT data stream at {rate} Hz")
 
 
+def request_attitude(drone, rate=1):
+    """
+    Requests the ATTITUDE data stream at a specified rate.
+
+    Args:
+        drone (mavutil.mavlink_connection): The drone connection.
+        rate (int): The rate at which to request the data stream (Hz). Default is 1 Hz.
+    """
+    drone.mav.request_data_stream_send(
+        drone.target_system,
+        drone.target_component,
+        mavutil.mavlink.MAV_DATA_STREAM_EXTRA1,
+        rate,
+        1,  # Enable the stream
+    )
+    print(f"Requested ATTITUDE data stream at {rate} Hz")
+
+
 def set_drone_mode(drone: mavutil.mavlink_connection, mode: str) -> None:
     """
     Sets the flight mode of the drone.
@@ -89,6 +132,7 @@ def set_drone_mode(drone: mavutil.mavlink_connection, mode: str) -> None:
 
     mode_id = drone.mode_mapping()[mode]
 
+    discard_acks(drone, mavutil.mavlink.MAV_CMD_DO_SET_MODE)
     # Set the mode
     drone.mav.set_mode_send(
         drone.target_system,
@@ -100,7 +144,12 @@ def set_drone_mode(drone: mavutil.mavlink_connection, mode: str) -> None:
     # MAVLink requires an ACK from the drone to confirm the mode change
     ack = None
     while not ack:
-        ack = try_recv_match(drone, message_name="COMMAND_ACK", blocking=True)
+        ack = try_recv_match(
+            drone,
+            message_name="COMMAND_ACK",
+            blocking=True,
+            condition=lambda msg: msg.command == mavutil.mavlink.MAV_CMD_DO_SET_MODE,
+        )
         if ack:
             try:
                 ack_result = ack.result
@@ -0,0 +1,176 @@
+from pymavlink import mavutil
+import math
+import threading
+import time
+from typing import Callable, Optional
+
+from geodesy import local_frame
+
+
+class SimulatedVehicle:
+    """
+    Minimal ArduCopter stand-in speaking MAVLink over UDP, for load testing
+    the client without hardware.
+
+    It answers the commands PyMavlinkHelper sends (arm, takeoff, land, mode
+    changes, position targets, TIMESYNC) and streams HEARTBEAT,
+    GLOBAL_POSITION_INT and ATTITUDE. Motion is a constant speed move
+    towards the current target, integrated in meters in the local frame of
+    the start position and converted to lat/lon only when sent. Connect the
+    helper with "udpin:127.0.0.1:<port>".
+    """
+
+    def __init__(
+        self,
+        port: int,
+        lat: float = 41.1055,
+        lon: float = 29.0234,
+        position_rate: float = 5,
+        on_position_target: Optional[Callable[[int, int, float], None]] = None,
+    ) -> None:
+        """
+        Args:
+            port (int): UDP port the client listens on.
+            lat (float): Start latitude in degrees.
+            lon (float): Start longitude in degrees.
+            position_rate (float): GLOBAL_POSITION_INT rate in Hz.
+            on_position_target (Callable[[int, int, float], None]): Called with
+                the raw lat/lon integers and the receive time of every
+                SET_POSITION_TARGET_GLOBAL_INT, used to measure command latency.
+        """
+        self.port = port
+        self.frame = local_frame(lat, lon)
+        # Position in meters from the start position, altitude above it
+        self.north = 0.0
+        self.east = 0.0
+        self.alt = 0.0
+        # (north, east, alt) to move to
+        self.target = None
+        self.velocity = (0.0, 0.0, 0.0)
+        self.armed = False
+        self.position_rate = position_rate
+        self.on_position_target = on_position_target
+        self.horizontal_speed = 5.0
+        self.vertical_speed = 2.0
+        self._boot = time.monotonic()
+        self._running = False
+
+    def start(self) -> None:
+        self.connection = mavutil.mavlink_connection(
+            f"udpout:127.0.0.1:{self.port}", source_system=1, source_component=1
+        )
+        self._running = True
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def stop(self) -> None:
+        self._running = False
+
+    def _boot_ms(self) -> int:
+        return int((time.monotonic() - self._boot) * 1000)
+
+    def _run(self) -> None:
+        step = 0.05
+        next_heartbeat = 0
+        next_position = 0
+        last = time.monotonic()
+        while self._running:
+            now = time.monotonic()
+            self._integrate(now - last)
+            last = now
+
+            if now >= next_heartbeat:
+                next_heartbeat = now + 1
+                self._send_heartbeat()
+            if now >= next_position:
+                next_position = now + 1 / self.position_rate
+                self._send_position()
+
+            while True:
+                msg = self.connection.recv_match(blocking=False)
+                if msg is None:
+                    break
+                try:
+                    self._handle(msg)
+                except Exception as e:
+                    print(f"Simulated vehicle {self.port} error: {e}")
+            time.sleep(step)
+
+    def _integrate(self, dt: float) -> None:
+        if self.target is None:
+            self.velocity = (0.0, 0.0, 0.0)
+            return
+        target_north, target_east, target_alt = self.target
+        north = target_north - self.north
+        east = target_east - self.east
+        up = target_alt - self.alt
+        distance = math.hypot(north, east)
+        scale = min(1.0, self.horizontal_speed * dt / distance) if distance else 0
+        climb = max(-self.vertical_speed * dt, min(self.vertical_speed * dt, up))
+
+        self.north += north * scale
+        self.east += east * scale
+        self.alt += climb
+        if dt > 0:
+            self.velocity = (north * scale / dt, east * scale / dt, -climb / dt)
+        if distance < 0.1 and abs(up) < 0.05:
+            self.target = None
+            if self.alt <= 0.05:
+                self.alt = 0.0
+                self.armed = False
+
+    def _send_heartbeat(self) -> None:
+        self.connection.mav.heartbeat_send(
+            mavutil.mavlink.MAV_TYPE_QUADROTOR,
+            mavutil.mavlink.MAV_AUTOPILOT_ARDUPILOTMEGA,
+            mavutil.mavlink.MAV_MODE_FLAG_CUSTOM_MODE_ENABLED
+            | (mavutil.mavlink.MAV_MODE_FLAG_SAFETY_ARMED if self.armed else 0),
+            4,  # GUIDED
+            mavutil.mavlink.MAV_STATE_ACTIVE,
+        )
+
+    def _send_position(self) -> None:
+        vx, vy, vz = self.velocity
+        boot_ms = self._boot_ms()
+        lat, lon, _ = self.frame.from_ned(self.north, self.east)
+        self.connection.mav.global_position_int_send(
+            boot_ms,
+            int(round(float(lat) * 1e7)),
+            int(round(float(lon) * 1e7)),
+            int(self.alt * 1000),
+            int(self.alt * 1000),
+            int(vx * 100),
+            int(vy * 100),
+            int(vz * 100),
+            0,
+        )
+        self.connection.mav.attitude_send(boot_ms, 0, 0, 0, 0, 0, 0)
+
+    def _ack(self, command: int) -> None:
+        self.connection.mav.command_ack_send(
+            command, mavutil.mavlink.MAV_RESULT_ACCEPTED
+        )
+
+    def _handle(self, msg) -> None:
+        msg_type = msg.get_type()
+        if msg_type == "COMMAND_LONG":
+            if msg.command == mavutil.mavlink.MAV_CMD_COMPONENT_ARM_DISARM:
+                self.armed = msg.param1 == 1
+            elif msg.command == mavutil.mavlink.MAV_CMD_NAV_TAKEOFF:
+                self.target = (self.north, self.east, msg.param7)
+            elif msg.command == mavutil.mavlink.MAV_CMD_NAV_LAND:
+                self.target = (self.north, self.east, 0.0)
+            self._ack(msg.command)
+
+        elif msg_type == "SET_MODE":
+            self._ack(mavutil.mavlink.MAV_CMD_DO_SET_MODE)
+
+        elif msg_type == "SET_POSITION_TARGET_GLOBAL_INT":
+            received_at = time.time()
+            if self.on_position_target is not None:
+                self.on_position_target(msg.lat_int, msg.lon_int, received_at)
+            if self.alt > 0:
+                north, east, _ = self.frame.to_ned(msg.lat_int / 1e7, msg.lon_int / 1e7)
+                self.target = (float(north), float(east), msg.alt)
+
+        elif msg_type == "TIMESYNC" and msg.tc1 == 0:
+            self.connection.mav.timesync_send(self._boot_ms() * 1000000, msg.ts1)
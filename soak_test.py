@@ -0,0 +1,342 @@
+"""
+Virtual swarm soak test.
+
+Runs many copies of the real client stack (start_client, process_message,
+PyMavlinkHelper) against SimulatedVehicle instances, spread over worker
+processes, with this script playing the server on a local MQTT broker.
+
+Clients are split into groups. Each group runs its clients, one thread
+each, in one process and their simulated vehicles in another, so the
+resource figures cover the client stack only. The server side sends init_connection, answers
+heartbeats (including the clock sync ping) and sends move commands, either
+per drone or batched on swarm/all. Command latency is measured from the
+server publish to the SET_POSITION_TARGET_GLOBAL_INT arriving at the
+simulated vehicle, so it covers the broker, paho, dispatch and MAVLink.
+
+    mosquitto -d
+    python3 soak_test.py --clients 200 --processes 8 --duration 60
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import paho.mqtt.client as mqtt
+
+import main
+from simulated_vehicle import SimulatedVehicle
+from time_sync import now_ms
+
+BASE_LAT = 41.1055
+BASE_LON = 29.0234
+# Every command moves the target north by this much, which makes the
+# lat integer the vehicle receives unique per command.
+LAT_STEP = 1e-5
+
+
+def run_vehicles(client_ids, args, results):
+    """
+    Runs the simulated vehicles of one group of clients and reports the
+    position targets they received when the test ends.
+    """
+    if not args.verbose:
+        sys.stdout = open(os.devnull, "w")
+
+    received = []
+    lock = threading.Lock()
+
+    for client_id in client_ids:
+
+        def on_position_target(lat_int, lon_int, received_at, client_id=client_id):
+            with lock:
+                received.append((client_id, lat_int, received_at))
+
+        SimulatedVehicle(
+            args.base_port + client_id,
+            BASE_LAT,
+            BASE_LON,
+            position_rate=args.position_rate,
+            on_position_target=on_position_target,
+        ).start()
+
+    time.sleep(args.warmup + args.duration + args.drain)
+    with lock:
+        records = list(received)
+    results.put({"received": records})
+    results.close()
+    results.join_thread()
+    os._exit(0)
+
+
+def run_clients(client_ids, args, results):
+    """
+    Runs one group of clients, one thread each, and reports the resource
+    usage of the process. The vehicles run in a separate process, so the
+    numbers cover the client stack only.
+    """
+    if not args.verbose:
+        sys.stdout = open(os.devnull, "w")
+    main.LOG_PATH = args.log_dir
+    # Interpreter and imports, before any client runs
+    startup_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    for client_id in client_ids:
+        threading.Thread(
+            target=main.start_client,
+            args=(client_id,),
+            kwargs={
+                "broker": args.broker,
+                "port": args.port,
+                "connection_string": f"udpin:127.0.0.1:{args.base_port + client_id}",
+            },
+            daemon=True,
+        ).start()
+
+    cpu_start = time.process_time()
+    time.sleep(args.warmup + args.duration + args.drain)
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    results.put(
+        {
+            "clients": len(client_ids),
+            "cpu_seconds": time.process_time() - cpu_start,
+            "wall_seconds": args.warmup + args.duration + args.drain,
+            # ru_maxrss is in kilobytes on Linux
+            "max_rss_kb": usage.ru_maxrss,
+            "startup_rss_kb": startup_rss_kb,
+        }
+    )
+    results.close()
+    results.join_thread()
+    # Heartbeat threads are not daemons, leave without waiting for them
+    os._exit(0)
+
+
+class SoakServer:
+    """
+    Server side of the soak test: counts everything the clients publish,
+    echoes heartbeats with the server time and sends commands.
+    """
+
+    def __init__(self, args) -> None:
+        self.args = args
+        self.counts = Counter()
+        # Publisher queueing latency reported in client heartbeats, per
+        # class: [count, total ms, max ms]
+        self.publish_latency = {}
+        self.sent = {}
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, "SOAK_SERVER")
+        self.client.on_connect = self.on_connect
+        self.client.on_message = self.on_message
+        self.client.connect(args.broker, args.port, 60)
+        self.client.loop_start()
+
+    def on_connect(self, client, userdata, flags, rc) -> None:
+        client.subscribe("server/+")
+
+    def on_message(self, client, userdata, message) -> None:
+        try:
+            data = json.loads(message.payload.decode())
+        except ValueError:
+            self.counts["invalid"] += 1
+            return
+        msg_type = data.get("msg_type")
+        self.counts[msg_type] += 1
+        if msg_type == "heartbeat":
+            client_id = message.topic.split("/")[1]
+            ping = data.get("args", {}).get("ping")
+            self.add_publish_latency(data.get("args", {}).get("publish_latency") or {})
+            self.send(
+                f"drone/{client_id}",
+                {
+                    "msg_type": "heartbeat",
+                    "args": {"ping": ping, "server_time": now_ms()},
+                },
+            )
+
+    def add_publish_latency(self, latency: dict) -> None:
+        for name, stats in latency.items():
+            if not stats.get("count"):
+                continue
+            totals = self.publish_latency.setdefault(name, [0, 0.0, 0.0])
+            totals[0] += stats["count"]
+            totals[1] += stats["mean"] * stats["count"]
+            totals[2] = max(totals[2], stats["max"])
+
+    def reset(self) -> None:
+        self.counts.clear()
+        self.publish_latency = {}
+
+    def send(self, topic: str, message: dict) -> None:
+        self.client.publish(topic, json.dumps(message))
+
+    def init_clients(self) -> None:
+        for client_id in range(self.args.clients):
+            self.send(
+                f"drone/{client_id}",
+                {
+                    "msg_type": "init_connection",
+                    "args": {
+                        "heartbeat_interval": self.args.heartbeat_interval,
+                        "state_interval": self.args.state_interval,
+                    },
+                },
+            )
+
+    def take_off(self) -> None:
+        for client_id in range(self.args.clients):
+            topic = f"drone/{client_id}"
+            self.send(topic, {"msg_type": "arm", "args": {"force": True}})
+            self.send(topic, {"msg_type": "takeoff", "args": {"altitude": 10}})
+
+    def send_commands(self, seq: int) -> None:
+        lat = BASE_LAT + seq * LAT_STEP
+        args = {"lat": lat, "lon": BASE_LON, "alt": 10}
+        lat_int = int(lat * 1e7)
+        if self.args.swarm:
+            sent_at = time.time()
+            self.send(
+                main.SWARM_TOPIC,
+                {
+                    "msg_type": "swarm",
+                    "args": {
+                        "commands": {
+                            str(client_id): {"msg_type": "move", "args": args}
+                            for client_id in range(self.args.clients)
+                        }
+                    },
+                },
+            )
+            for client_id in range(self.args.clients):
+                self.sent[(client_id, lat_int)] = sent_at
+        else:
+            for client_id in range(self.args.clients):
+                self.sent[(client_id, lat_int)] = time.time()
+                self.send(f"drone/{client_id}", {"msg_type": "move", "args": args})
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def report(args, server, vehicle_results, client_results, publish_counts) -> None:
+    latencies = []
+    for result in vehicle_results:
+        for client_id, lat_int, received_at in result["received"]:
+            sent_at = server.sent.get((client_id, lat_int))
+            if sent_at is not None:
+                latencies.append((received_at - sent_at) * 1000)
+    latencies.sort()
+
+    print(f"\nClients: {args.clients} in {len(client_results)} client processes")
+    print(f"Duration: {args.duration} s")
+    print("\nPublish rates received by the server (msg/s):")
+    for msg_type, count in sorted(publish_counts.items(), key=str):
+        print(f"  {msg_type:<20} {count / args.duration:10.1f}")
+
+    print("\nPublisher queueing latency (queued -> handed to paho):")
+    for name, (count, total, peak) in sorted(server.publish_latency.items()):
+        print(f"  {name:<10} mean {total / count:8.1f} ms  max {peak:8.1f} ms")
+
+    print("\nCommand latency (server publish -> vehicle):")
+    print(f"  sent {len(server.sent)}, delivered {len(latencies)}")
+    if latencies:
+        for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+            print(f"  {name} {percentile(latencies, fraction):8.1f} ms")
+        print(f"  max {latencies[-1]:8.1f} ms")
+
+    print("\nPer client resources (client process only, vehicles excluded):")
+    for i, result in enumerate(client_results):
+        clients = max(1, result["clients"])
+        cpu = result["cpu_seconds"] / result["wall_seconds"] / clients * 100
+        startup = result["startup_rss_kb"] / 1024
+        rss = (result["max_rss_kb"] - result["startup_rss_kb"]) / 1024 / clients
+        print(
+            f"  process {i}: {clients} clients, {cpu:5.2f} % CPU,"
+            f" {rss:6.2f} MB RSS each on top of {startup:.1f} MB at startup"
+        )
+
+
+def main_soak():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=os.cpu_count(),
+        help="Client groups, each runs as one client and one vehicle process",
+    )
+    parser.add_argument("--broker", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--base-port", type=int, default=20000)
+    parser.add_argument("--duration", type=float, default=60, help="Seconds")
+    parser.add_argument("--warmup", type=float, default=10, help="Seconds")
+    parser.add_argument("--drain", type=float, default=5, help="Seconds")
+    parser.add_argument(
+        "--command-rate", type=float, default=1, help="Commands per second per drone"
+    )
+    parser.add_argument("--heartbeat-interval", type=int, default=1000, help="ms")
+    parser.add_argument("--state-interval", type=int, default=200, help="ms")
+    parser.add_argument("--position-rate", type=float, default=5, help="Hz")
+    parser.add_argument(
+        "--swarm", action="store_true", help="Send commands batched on swarm/all"
+    )
+    parser.add_argument("--log-dir", help="Default: a new temporary directory")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    if args.log_dir is None:
+        args.log_dir = tempfile.mkdtemp(prefix="soak_logs_")
+
+    vehicle_queue = multiprocessing.Queue()
+    client_queue = multiprocessing.Queue()
+    workers = []
+    for i in range(args.processes):
+        client_ids = list(range(i, args.clients, args.processes))
+        if not client_ids:
+            continue
+        for target, results_queue in (
+            (run_vehicles, vehicle_queue),
+            (run_clients, client_queue),
+        ):
+            worker = multiprocessing.Process(
+                target=target, args=(client_ids, args, results_queue)
+            )
+            worker.start()
+            workers.append(worker)
+
+    server = SoakServer(args)
+    # Let the clients connect to the broker before initializing them
+    time.sleep(2)
+    server.init_clients()
+    time.sleep(max(0, args.warmup / 2 - 2))
+    server.take_off()
+    time.sleep(args.warmup / 2)
+
+    print(f"Sending commands for {args.duration} s...")
+    server.reset()
+    start = time.monotonic()
+    seq = 0
+    while time.monotonic() - start < args.duration:
+        seq += 1
+        server.send_commands(seq)
+        time.sleep(max(0, start + seq / args.command_rate - time.monotonic()))
+    publish_counts = Counter(server.counts)
+
+    groups = len(workers) // 2
+    vehicle_results = [vehicle_queue.get() for _ in range(groups)]
+    client_results = [client_queue.get() for _ in range(groups)]
+    for worker in workers:
+        worker.join()
+    report(args, server, vehicle_results, client_results, publish_counts)
+
+
+if __name__ == "__main__":
+    main_soak()
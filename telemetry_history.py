@@ -0,0 +1,183 @@
+import math
+import threading
+from typing import Optional
+
+import numpy as np
+
+from geodesy import local_offsets
+
+SAMPLE_DTYPE = np.dtype(
+    [
+        ("t", np.float64),  # autopilot time since boot in seconds
+        ("lat", np.float64),  # degrees
+        ("lon", np.float64),  # degrees
+        ("alt", np.float32),  # relative altitude in meters
+        ("vx", np.float32),  # north velocity in m/s
+        ("vy", np.float32),  # east velocity in m/s
+        ("vz", np.float32),  # down velocity in m/s
+        ("roll", np.float32),  # radians
+        ("pitch", np.float32),  # radians
+        ("yaw", np.float32),  # radians
+    ]
+)
+
+
+class TelemetryHistory:
+    """
+    Fixed-size ring buffer of the most recent position, velocity and attitude
+    samples.
+
+    Storage is a single preallocated structured array (52 bytes per sample),
+    so appending never allocates and the footprint is known up front. One row
+    is written per GLOBAL_POSITION_INT, holding the latest ATTITUDE values.
+
+    Sample times are the autopilot's time_boot_ms, which is monotonic and
+    unaffected by the host clock or its sync state. The buffer is cleared if
+    time goes backwards, i.e. after an autopilot reboot.
+
+    The autopilot may send GLOBAL_POSITION_INT faster than requested, e.g.
+    when a GCS asks for a higher rate, so samples arriving sooner than
+    1 / rate after the last stored one are skipped and the buffer always
+    covers the requested number of seconds.
+    """
+
+    def __init__(
+        self,
+        seconds: float = 30,
+        rate: float = 1,
+    ) -> None:
+        """
+        Args:
+            seconds (float): Length of history to keep.
+            rate (float): GLOBAL_POSITION_INT rate in Hz requested from the
+                autopilot, which sizes the buffer and is the highest rate
+                samples are stored at.
+        """
+        # A little under the period, so jitter in the autopilot's send times
+        # does not skip every other sample at the requested rate. Sized for
+        # the densest spacing this allows, so a full buffer spans seconds.
+        self._min_interval = 0.9 / rate
+        self.capacity = max(2, math.ceil(seconds / self._min_interval) + 1)
+        self._samples = np.zeros(self.capacity, dtype=SAMPLE_DTYPE)
+        self._next = 0
+        self._count = 0
+        self._attitude = (0.0, 0.0, 0.0)
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        return self._samples.nbytes
+
+    def __len__(self) -> int:
+        return self._count
+
+    def attach(self, vehicle) -> None:
+        if self._on_message not in vehicle.message_hooks:
+            vehicle.message_hooks.append(self._on_message)
+
+    def _on_message(self, mav, msg) -> None:
+        msg_type = msg.get_type()
+        if msg_type == "ATTITUDE":
+            self._attitude = (msg.roll, msg.pitch, msg.yaw)
+        elif msg_type == "GLOBAL_POSITION_INT":
+            self.append(
+                msg.time_boot_ms / 1000,
+                msg.lat / 1e7,
+                msg.lon / 1e7,
+                msg.relative_alt / 1000.0,
+                msg.vx / 100.0,
+                msg.vy / 100.0,
+                msg.vz / 100.0,
+                *self._attitude,
+            )
+
+    def append(
+        self,
+        t: float,
+        lat: float,
+        lon: float,
+        alt: float,
+        vx: float,
+        vy: float,
+        vz: float,
+        roll: float = 0.0,
+        pitch: float = 0.0,
+        yaw: float = 0.0,
+    ) -> None:
+        with self._lock:
+            if self._count:
+                last_t = self._samples["t"][self._next - 1]
+                if t < last_t:
+                    # Time went backwards, window() relies on sorted times
+                    self._next = 0
+                    self._count = 0
+                elif t - last_t < self._min_interval:
+                    return
+            self._samples[self._next] = (t, lat, lon, alt, vx, vy, vz, roll, pitch, yaw)
+            self._next = (self._next + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    def window(self, seconds: Optional[float] = None) -> np.ndarray:
+        """
+        Return a copy of the samples of the last seconds, oldest first.
+
+        Args:
+            seconds (float): Window length measured back from the newest
+                sample. None returns the whole buffer.
+        """
+        with self._lock:
+            if self._count < self.capacity:
+                samples = self._samples[: self._count].copy()
+            else:
+                samples = np.concatenate(
+                    (self._samples[self._next :], self._samples[: self._next])
+                )
+        if seconds is None or len(samples) == 0:
+            return samples
+        start = np.searchsorted(samples["t"], samples["t"][-1] - seconds)
+        return samples[start:]
+
+    def latest(self) -> Optional[np.void]:
+        with self._lock:
+            if self._count == 0:
+                return None
+            return self._samples[self._next - 1].copy()
+
+    def average_velocity(self, seconds: Optional[float] = None) -> Optional[np.ndarray]:
+        """
+        Mean north, east and down velocity in m/s over the window.
+        """
+        samples = self.window(seconds)
+        if len(samples) == 0:
+            return None
+        return np.array(
+            [samples["vx"].mean(), samples["vy"].mean(), samples["vz"].mean()]
+        )
+
+    def distance_travelled(self, seconds: Optional[float] = None) -> float:
+        """
+        Length of the 3D path in meters over the window.
+        """
+        samples = self.window(seconds)
+        if len(samples) < 2:
+            return 0.0
+        lat = samples["lat"]
+        lon = samples["lon"]
+        north, east = local_offsets(lat[:-1], lon[:-1], lat[1:], lon[1:])
+        up = np.diff(samples["alt"].astype(np.float64))
+        return float(np.sqrt(north**2 + east**2 + up**2).sum())
+
+    def time_since_stationary(self, speed_threshold: float = 0.3) -> Optional[float]:
+        """
+        Seconds since the last sample with a 3D speed below speed_threshold,
+        0 if the drone is stationary now and None if it has not been
+        stationary within the buffer.
+        """
+        samples = self.window()
+        if len(samples) == 0:
+            return None
+        speed_squared = samples["vx"] ** 2 + samples["vy"] ** 2 + samples["vz"] ** 2
+        stationary = np.flatnonzero(speed_squared < speed_threshold**2)
+        if len(stationary) == 0:
+            return None
+        return float(samples["t"][-1] - samples["t"][stationary[-1]])
@@ -0,0 +1,65 @@
+import threading
+
+from command_scheduler import CommandScheduler
+from time_sync import now_ms
+
+
+def run_all(scheduler, entries, timeout=2.0):
+    """Schedule (run_at, name) entries and return the names in run order."""
+    ran = []
+    done = threading.Event()
+
+    def make_callback(name):
+        def callback():
+            ran.append(name)
+            if len(ran) == len(entries):
+                done.set()
+
+        return callback
+
+    for run_at, name in entries:
+        scheduler.schedule(run_at, make_callback(name))
+    assert done.wait(timeout)
+    return ran
+
+
+def test_runs_in_time_order():
+    scheduler = CommandScheduler()
+    start = now_ms()
+    ran = run_all(
+        scheduler,
+        [(start + 150, "third"), (start + 50, "first"), (start + 100, "second")],
+    )
+    assert ran == ["first", "second", "third"]
+
+
+def test_same_time_keeps_scheduling_order():
+    scheduler = CommandScheduler()
+    run_at = now_ms() + 50
+    ran = run_all(scheduler, [(run_at, "a"), (run_at, "b"), (run_at, "c")])
+    assert ran == ["a", "b", "c"]
+
+
+def test_past_times_run_immediately():
+    scheduler = CommandScheduler()
+    start = now_ms()
+    ran = []
+    done = threading.Event()
+
+    def callback():
+        ran.append(now_ms())
+        done.set()
+
+    scheduler.schedule(start - 10000, callback)
+    assert done.wait(1)
+    assert ran[0] - start < 500
+
+
+def test_failing_callback_does_not_stop_the_worker():
+    scheduler = CommandScheduler()
+
+    def fail():
+        raise RuntimeError("boom")
+
+    scheduler.schedule(now_ms(), fail)
+    assert run_all(scheduler, [(now_ms(), "after")]) == ["after"]
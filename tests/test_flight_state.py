@@ -0,0 +1,124 @@
+import time
+
+from flight_state import (
+    EVENT_LANDED,
+    EVENT_STATE_CHANGED,
+    EVENT_TAKEOFF_COMPLETE,
+    EVENT_TAKEOFF_FAILED,
+    EVENT_TARGET_REACHED,
+    FlightStateTracker,
+    HOVERING,
+    LANDING,
+    MOVING,
+    ON_GROUND,
+    TAKING_OFF,
+)
+
+LAT = 41.1055
+LON = 29.0234
+
+
+def make_tracker(**kwargs):
+    events = []
+    tracker = FlightStateTracker(
+        on_event=lambda event, state, args: events.append((event, state)), **kwargs
+    )
+    return tracker, events
+
+
+def test_takeoff_hover_move_and_land():
+    tracker, events = make_tracker()
+    tracker.command_takeoff(10)
+    tracker.update(LAT, LON, 5, 0, 0)
+    assert tracker.state == TAKING_OFF
+    tracker.update(LAT, LON, 9, 0, 0)
+    assert tracker.state == HOVERING
+
+    tracker.command_move(LAT + 0.001, LON, 9)
+    assert tracker.state == MOVING
+    tracker.update(LAT + 0.0005, LON, 9, 5, 0)
+    assert tracker.state == MOVING
+    tracker.update(LAT + 0.001, LON, 9, 0.2, 0)
+    assert tracker.state == HOVERING
+
+    tracker.command_land()
+    assert tracker.state == LANDING
+    tracker.update(LAT + 0.001, LON, 0.1, 0, 0)
+    assert tracker.state == ON_GROUND
+
+    assert [event for event, _ in events] == [
+        EVENT_STATE_CHANGED,
+        EVENT_TAKEOFF_COMPLETE,
+        EVENT_STATE_CHANGED,
+        EVENT_TARGET_REACHED,
+        EVENT_STATE_CHANGED,
+        EVENT_LANDED,
+    ]
+
+
+def test_rejected_takeoff_stays_on_ground():
+    tracker, events = make_tracker()
+    tracker.takeoff_failed("rejected")
+    tracker.command_land()
+
+    assert tracker.state == ON_GROUND
+    assert events == [(EVENT_TAKEOFF_FAILED, ON_GROUND)]
+
+
+def test_takeoff_without_climb_times_out():
+    tracker, events = make_tracker(takeoff_timeout=0.01)
+    tracker.command_takeoff(10)
+    tracker.update(LAT, LON, 0, 0, 0)
+    assert tracker.state == TAKING_OFF
+    time.sleep(0.02)
+    tracker.update(LAT, LON, 0, 0, 0)
+
+    assert tracker.state == ON_GROUND
+    assert events[-1] == (EVENT_TAKEOFF_FAILED, ON_GROUND)
+    # A later land must not report a landing that never happened
+    tracker.command_land()
+    tracker.update(LAT, LON, 0, 0, 0)
+    assert EVENT_LANDED not in [event for event, _ in events]
+
+
+def test_airborne_drone_is_detected_without_commands():
+    tracker, _ = make_tracker()
+    tracker.update(LAT, LON, 5, 0, 0)
+    assert tracker.state == HOVERING
+    tracker.update(LAT, LON, 5, 2, 0)
+    assert tracker.state == MOVING
+
+
+def test_passing_through_target_at_speed_is_not_arrival():
+    tracker, events = make_tracker()
+    tracker.update(LAT, LON, 9, 0, 0)
+    tracker.command_move(LAT + 0.001, LON, 9)
+
+    # Overshoot the target at 5 m/s, then come back and stop on it
+    tracker.update(LAT + 0.001, LON, 9, 5, 0)
+    assert tracker.state == MOVING
+    tracker.update(LAT + 0.00101, LON, 9, -1, 0)
+    assert tracker.state == MOVING
+    tracker.update(LAT + 0.001, LON, 9, 0.1, 0)
+    assert tracker.state == HOVERING
+
+    assert [event for event, _ in events].count(EVENT_TARGET_REACHED) == 1
+    assert events[-1] == (EVENT_TARGET_REACHED, HOVERING)
+
+
+def test_speed_noise_between_thresholds_does_not_flap():
+    tracker, events = make_tracker()
+    tracker.update(LAT, LON, 5, 0, 0)
+    assert tracker.state == HOVERING
+    for speed in (0.45, 0.35, 0.48, 0.4):
+        tracker.update(LAT, LON, 5, speed, 0)
+    assert tracker.state == HOVERING
+
+    tracker.update(LAT, LON, 5, 0.6, 0)
+    assert tracker.state == MOVING
+    for speed in (0.45, 0.35, 0.48, 0.4):
+        tracker.update(LAT, LON, 5, speed, 0)
+    assert tracker.state == MOVING
+    tracker.update(LAT, LON, 5, 0.2, 0)
+    assert tracker.state == HOVERING
+    assert len(events) == 3
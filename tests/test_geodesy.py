@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from geodesy import LocalFrame, bearing, horizontal_distance, local_frame
+
+LAT = 41.1055
+LON = 29.0234
+ALT = 45.0
+
+
+def test_ned_round_trip_on_arrays():
+    frame = LocalFrame(LAT, LON, ALT)
+    north = np.array([0.0, 120.5, -800.0, 2500.0])
+    east = np.array([0.0, -40.0, 950.0, 3000.0])
+    down = np.array([0.0, -10.0, -60.0, 5.0])
+
+    lat, lon, alt = frame.from_ned(north, east, down)
+    assert lat.shape == north.shape
+    n, e, d = frame.to_ned(lat, lon, alt)
+    np.testing.assert_allclose(n, north, atol=1e-3)
+    np.testing.assert_allclose(e, east, atol=1e-3)
+    np.testing.assert_allclose(d, down, atol=1e-3)
+
+
+def test_origin_maps_to_zero():
+    frame = LocalFrame(LAT, LON, ALT)
+    np.testing.assert_allclose(frame.to_ned(LAT, LON, 0.0), (0, 0, 0), atol=1e-6)
+
+
+def test_horizontal_distance_matches_the_frame():
+    frame = LocalFrame(LAT, LON)
+    lat = LAT + np.array([0.001, -0.01, 0.02, 0.0])
+    lon = LON + np.array([0.001, 0.015, -0.02, 0.03])
+
+    north, east, _ = frame.to_ned(lat, lon)
+    expected = np.hypot(north, east)
+    distance = horizontal_distance(LAT, LON, lat, lon)
+    # Centimetres over a few kilometres
+    np.testing.assert_allclose(distance, expected, rtol=1e-4, atol=0.05)
+
+
+@pytest.mark.parametrize(
+    "dlat, dlon, expected",
+    [(0.01, 0, 0), (0, 0.01, 90), (-0.01, 0, 180), (0, -0.01, 270)],
+)
+def test_bearing_at_cardinal_directions(dlat, dlon, expected):
+    assert bearing(LAT, LON, LAT + dlat, LON + dlon) == pytest.approx(
+        expected, abs=1e-6
+    )
+
+
+def test_offset_moves_points_by_ned_meters():
+    frame = LocalFrame(LAT, LON, ALT)
+    lat, lon, alt = frame.offset(
+        np.array([LAT, LAT + 0.001]), np.array([LON, LON]), 10.0, 30.0, -20.0, -5.0
+    )
+
+    north, east, down = frame.to_ned(lat, lon, alt)
+    start_north, start_east, start_down = frame.to_ned(
+        np.array([LAT, LAT + 0.001]), np.array([LON, LON]), 10.0
+    )
+    np.testing.assert_allclose(north - start_north, 30.0, atol=1e-3)
+    np.testing.assert_allclose(east - start_east, -20.0, atol=1e-3)
+    np.testing.assert_allclose(down - start_down, -5.0, atol=1e-3)
+    np.testing.assert_allclose(alt, 15.0, atol=1e-3)
+
+
+def test_local_frame_is_shared_per_home():
+    frame = local_frame(LAT, LON, ALT)
+    assert local_frame(LAT, LON, ALT) is frame
+    assert local_frame(LAT, LON, ALT + 1) is not frame
+    assert (frame.lat, frame.lon, frame.alt) == (LAT, LON, ALT)
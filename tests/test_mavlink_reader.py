@@ -0,0 +1,140 @@
+import queue
+import time
+
+from pymavlink import mavutil
+
+from mavlink_reader import MavlinkReader
+from pymavlink_utils import discard_acks, set_drone_mode, try_recv_match
+
+MAV_CMD_NAV_LAND = mavutil.mavlink.MAV_CMD_NAV_LAND
+MAV_CMD_DO_SET_MODE = mavutil.mavlink.MAV_CMD_DO_SET_MODE
+MAV_RESULT_ACCEPTED = mavutil.mavlink.MAV_RESULT_ACCEPTED
+
+
+class Message:
+    def __init__(self, msg_type, **fields):
+        self.msg_type = msg_type
+        self.__dict__.update(fields)
+
+    def get_type(self):
+        return self.msg_type
+
+
+def ack(command):
+    return Message("COMMAND_ACK", command=command, result=MAV_RESULT_ACCEPTED)
+
+
+class FakeMav:
+    def __init__(self, connection):
+        self.connection = connection
+        self.sent = []
+
+    def send(self, msg):
+        self.sent.append(msg)
+
+    def set_mode_send(self, target_system, base_mode, custom_mode):
+        self.connection.incoming.put(ack(MAV_CMD_DO_SET_MODE))
+
+
+class FakeConnection:
+    """Stands in for a mavfile, messages put on incoming are received."""
+
+    target_system = 1
+    target_component = 1
+
+    def __init__(self):
+        self.incoming = queue.Queue()
+        self.message_hooks = []
+        self.mav = FakeMav(self)
+
+    def recv_match(self, blocking=False, timeout=None):
+        try:
+            msg = self.incoming.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        for hook in self.message_hooks:
+            hook(self, msg)
+        return msg
+
+    def write(self, buf):
+        pass
+
+    def close(self):
+        pass
+
+    def mode_mapping(self):
+        return {"GUIDED": 4}
+
+
+def start_reader(**kwargs):
+    connection = FakeConnection()
+    reader = MavlinkReader(connection, **kwargs)
+    reader.start()
+    return connection, reader
+
+
+def wait_buffered(reader, msg_type):
+    deadline = time.monotonic() + 1
+    while not reader._buffers.get(msg_type) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_hooks_run_without_any_waiter():
+    connection, reader = start_reader()
+    seen = []
+    connection.message_hooks.append(lambda mav, msg: seen.append(msg.get_type()))
+    connection.incoming.put(Message("HEARTBEAT"))
+    wait_buffered(reader, "HEARTBEAT")
+    reader.close()
+    assert seen == ["HEARTBEAT"]
+
+
+def test_set_mode_ignores_unrelated_buffered_ack():
+    connection, reader = start_reader()
+    connection.incoming.put(ack(MAV_CMD_NAV_LAND))
+    wait_buffered(reader, "COMMAND_ACK")
+
+    set_drone_mode(reader, "GUIDED")
+
+    # The mode ack was consumed, the land ack is still there for its owner
+    remaining = reader.recv_match(type="COMMAND_ACK")
+    assert remaining.command == MAV_CMD_NAV_LAND
+    assert reader.recv_match(type="COMMAND_ACK") is None
+    reader.close()
+
+
+def test_unclaimed_messages_expire():
+    connection, reader = start_reader(max_age=0.05)
+    connection.incoming.put(ack(MAV_CMD_NAV_LAND))
+    wait_buffered(reader, "COMMAND_ACK")
+    time.sleep(0.1)
+    assert reader.recv_match(type="COMMAND_ACK") is None
+    reader.close()
+
+
+def test_discard_acks_drops_only_matching_command():
+    connection, reader = start_reader()
+    connection.incoming.put(ack(MAV_CMD_DO_SET_MODE))
+    connection.incoming.put(ack(MAV_CMD_NAV_LAND))
+    deadline = time.monotonic() + 1
+    while len(reader._buffers["COMMAND_ACK"]) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    discard_acks(reader, MAV_CMD_DO_SET_MODE)
+    msg = try_recv_match(reader, "COMMAND_ACK", retries=1, timeout=0.1)
+    assert msg.command == MAV_CMD_NAV_LAND
+    reader.close()
+
+
+def test_recv_latest_returns_newest_and_clears():
+    connection, reader = start_reader()
+    for boot_ms in (1, 2, 3):
+        connection.incoming.put(Message("GLOBAL_POSITION_INT", time_boot_ms=boot_ms))
+    deadline = time.monotonic() + 1
+    while connection.incoming.qsize() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.02)
+
+    assert reader.recv_latest("GLOBAL_POSITION_INT", timeout=0.5).time_boot_ms == 3
+    assert reader.recv_latest("GLOBAL_POSITION_INT", blocking=False) is None
+    reader.close()
@@ -0,0 +1,107 @@
+import pytest
+
+from message_registry import (
+    ERROR_INVALID_ARGS,
+    ERROR_INVALID_MESSAGE,
+    ERROR_UNKNOWN_TYPE,
+    FLAG,
+    NUMBER,
+    MessageError,
+    MessageRegistry,
+    compile_schema,
+)
+
+
+def test_required_arguments_pass_through_unchanged():
+    validate = compile_schema({"lat": NUMBER, "mode": str})
+    args = {"lat": 41.1, "mode": "GUIDED", "extra": [1]}
+    assert validate(args) is args
+
+
+def test_missing_required_argument_is_rejected():
+    validate = compile_schema({"lat": NUMBER})
+    with pytest.raises(MessageError) as error:
+        validate({})
+    assert error.value.code == ERROR_INVALID_ARGS
+    assert "missing argument lat" in error.value.detail
+
+
+def test_default_fills_a_copy():
+    validate = compile_schema({"vx": [NUMBER, 0]})
+    args = {}
+    result = validate(args)
+    assert result == {"vx": 0}
+    assert args == {}
+
+
+def test_given_optional_argument_is_kept():
+    validate = compile_schema({"vx": [NUMBER, 0]})
+    assert validate({"vx": 2.5}) == {"vx": 2.5}
+
+
+def test_none_default_accepts_missing_and_explicit_null():
+    validate = compile_schema({"execute_at": [NUMBER, None]})
+    assert validate({}) == {"execute_at": None}
+    assert validate({"execute_at": None}) == {"execute_at": None}
+    assert validate({"execute_at": 1000}) == {"execute_at": 1000}
+
+
+def test_null_is_rejected_without_none_default():
+    validate = compile_schema({"vx": [NUMBER, 0]})
+    with pytest.raises(MessageError):
+        validate({"vx": None})
+
+
+@pytest.mark.parametrize("value", [True, False])
+def test_bool_is_not_a_number(value):
+    validate = compile_schema({"altitude": NUMBER})
+    with pytest.raises(MessageError) as error:
+        validate({"altitude": value})
+    assert "altitude must be int/float" in error.value.detail
+
+
+@pytest.mark.parametrize("value", ["10", [10], {"alt": 10}])
+def test_wrong_type_is_rejected(value):
+    validate = compile_schema({"altitude": NUMBER})
+    with pytest.raises(MessageError):
+        validate({"altitude": value})
+
+
+@pytest.mark.parametrize("value", [True, False, 0, 1])
+def test_flag_accepts_bool_and_integer(value):
+    validate = compile_schema({"force": FLAG})
+    assert validate({"force": value}) == {"force": value}
+
+
+def test_args_must_be_an_object():
+    validate = compile_schema({"lat": NUMBER})
+    with pytest.raises(MessageError):
+        validate([41.1])
+
+
+def test_dispatch_runs_handler_with_validated_args():
+    registry = MessageRegistry()
+    calls = []
+
+    @registry.register("move", {"lat": NUMBER, "vx": [NUMBER, 0]})
+    def handle_move(args, context):
+        calls.append((args, context))
+
+    registry.dispatch({"msg_type": "move", "args": {"lat": 41.1}}, "context")
+    assert calls == [({"lat": 41.1, "vx": 0}, "context")]
+
+
+def test_dispatch_errors():
+    registry = MessageRegistry()
+    registry.register("land")(lambda args, context: None)
+
+    with pytest.raises(MessageError) as error:
+        registry.dispatch({"msg_type": "fly"})
+    assert error.value.code == ERROR_UNKNOWN_TYPE
+
+    with pytest.raises(MessageError) as error:
+        registry.dispatch("land")
+    assert error.value.code == ERROR_INVALID_MESSAGE
+
+    # Messages without args are valid for types without arguments
+    registry.dispatch({"msg_type": "land"})
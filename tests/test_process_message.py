@@ -0,0 +1,205 @@
+import pytest
+
+from compass_calibration import STATUS_RUNNING, STATUS_SUCCESS
+from message_registry import (
+    ERROR_HANDLER,
+    ERROR_INVALID_ARGS,
+    ERROR_INVALID_MESSAGE,
+    ERROR_NOT_SYNCED,
+    MessageError,
+)
+from process_message import process_message, swarm_slice
+from publisher import PRIORITY_EVENT, PRIORITY_LOG
+from time_sync import ClockOffsetEstimator
+
+
+class FakePublisher:
+    """Records publish calls instead of queueing them."""
+
+    def __init__(self):
+        self.published = []
+        self.withdrawn = []
+
+    def publish(
+        self, topic, message, priority=PRIORITY_LOG, coalesce_key=None, **kwargs
+    ):
+        self.published.append((topic, message, priority, coalesce_key))
+        return True
+
+    def withdraw(self, coalesce_key):
+        self.withdrawn.append(coalesce_key)
+        return True
+
+    def errors(self):
+        return [
+            message["args"]
+            for _, message, _, _ in self.published
+            if message["msg_type"] == "error"
+        ]
+
+
+class FakeHelper:
+    def __init__(self):
+        self.calibration = None
+        self.commands = []
+
+    def land(self):
+        self.commands.append("land")
+
+    def takeoff(self, altitude):
+        self.commands.append(("takeoff", altitude))
+
+    def start_compass_calibration(self, on_update, timeout, max_rate, retry):
+        if self.calibration is not None:
+            raise RuntimeError("Compass calibration already running")
+        self.calibration = on_update
+
+    def cancel_compass_calibration(self):
+        self.calibration = None
+
+
+class FakeHeartbeatProcessor:
+    def __init__(self, offset=None):
+        self.server_clock = ClockOffsetEstimator()
+        if offset is not None:
+            self.server_clock.add_sample(1000, 1000 + offset, 1000)
+
+
+class FakeScheduler:
+    def __init__(self):
+        self.scheduled = []
+
+    def schedule(self, run_at, callback):
+        self.scheduled.append((run_at, callback))
+
+
+def dispatch(message, publisher, helper=None, heartbeat_processor=None, scheduler=None):
+    process_message(message, None, publisher, helper, heartbeat_processor, 7, scheduler)
+
+
+def test_compass_calibration_rejects_unknown_action():
+    publisher = FakePublisher()
+    helper = FakeHelper()
+    dispatch(
+        {"msg_type": "compass_calibration", "args": {"action": "stop"}},
+        publisher,
+        helper,
+    )
+    assert helper.calibration is None
+    assert publisher.errors()[0]["code"] == ERROR_INVALID_ARGS
+
+
+def test_compass_calibration_already_running_is_reported():
+    publisher = FakePublisher()
+    helper = FakeHelper()
+    message = {"msg_type": "compass_calibration", "args": {"action": "start"}}
+    dispatch(message, publisher, helper)
+    dispatch(message, publisher, helper)
+    errors = publisher.errors()
+    assert len(errors) == 1
+    assert errors[0]["code"] == ERROR_HANDLER
+    assert errors[0]["request"] == "compass_calibration"
+
+
+def test_compass_calibration_result_withdraws_queued_progress():
+    publisher = FakePublisher()
+    helper = FakeHelper()
+    dispatch({"msg_type": "compass_calibration", "args": {}}, publisher, helper)
+
+    helper.calibration(STATUS_RUNNING, {"0": 50})
+    assert publisher.withdrawn == []
+    helper.calibration(STATUS_SUCCESS, {"0": 100})
+    assert publisher.withdrawn == ["compass_calibration"]
+
+    (_, _, progress_priority, key), (_, result, result_priority, _) = (
+        publisher.published
+    )
+    assert (progress_priority, key) == (PRIORITY_LOG, "compass_calibration")
+    assert result_priority == PRIORITY_EVENT
+    assert result["args"]["status"] == STATUS_SUCCESS
+
+
+def batch(commands, **args):
+    return {"msg_type": "swarm", "args": dict(args, commands=commands)}
+
+
+def test_swarm_slice_keeps_only_this_client():
+    message = batch(
+        {"7": {"msg_type": "land"}, "8": {"msg_type": "takeoff"}}, execute_at=5
+    )
+    assert swarm_slice(message, 7) == batch({"7": {"msg_type": "land"}}, execute_at=5)
+    assert "8" in message["args"]["commands"]
+
+
+def test_swarm_slice_without_entry_for_client():
+    assert swarm_slice(batch({"8": {"msg_type": "land"}}), 7) is None
+
+
+def test_swarm_slice_passes_malformed_batch_to_the_validator():
+    message = {"msg_type": "swarm", "args": {"commands": []}}
+    assert swarm_slice(message, 7) is message
+
+
+@pytest.mark.parametrize("message", [{"msg_type": "land"}, [1], "land"])
+def test_swarm_slice_rejects_other_messages(message):
+    with pytest.raises(MessageError) as error:
+        swarm_slice(message, 7)
+    assert error.value.code == ERROR_INVALID_MESSAGE
+
+
+def test_swarm_runs_this_clients_command():
+    publisher = FakePublisher()
+    helper = FakeHelper()
+    commands = {
+        "7": {"msg_type": "takeoff", "args": {"altitude": 5}},
+        "8": {"msg_type": "land"},
+    }
+    dispatch(batch(commands), publisher, helper)
+    assert helper.commands == [("takeoff", 5)]
+    assert publisher.errors() == []
+
+
+def test_swarm_ignores_batch_without_this_client():
+    publisher = FakePublisher()
+    helper = FakeHelper()
+    dispatch(batch({"8": {"msg_type": "land"}}), publisher, helper)
+    assert helper.commands == []
+    assert publisher.errors() == []
+
+
+def test_swarm_ignores_nested_swarm():
+    publisher = FakePublisher()
+    helper = FakeHelper()
+    nested = batch({"7": {"msg_type": "land"}})
+    dispatch(batch({"7": nested}), publisher, helper)
+    assert helper.commands == []
+    assert publisher.errors() == []
+
+
+def test_swarm_execute_at_before_clock_sync_is_rejected():
+    publisher = FakePublisher()
+    helper = FakeHelper()
+    scheduler = FakeScheduler()
+    message = batch({"7": {"msg_type": "land"}}, execute_at=2000)
+    dispatch(message, publisher, helper, FakeHeartbeatProcessor(), scheduler)
+
+    assert scheduler.scheduled == []
+    assert helper.commands == []
+    errors = publisher.errors()
+    assert len(errors) == 1
+    assert errors[0]["code"] == ERROR_NOT_SYNCED
+    assert errors[0]["request"] == "swarm"
+
+
+def test_swarm_execute_at_is_scheduled_in_host_time():
+    publisher = FakePublisher()
+    helper = FakeHelper()
+    scheduler = FakeScheduler()
+    message = batch({"7": {"msg_type": "land"}}, execute_at=2000)
+    dispatch(message, publisher, helper, FakeHeartbeatProcessor(500), scheduler)
+
+    ((run_at, callback),) = scheduler.scheduled
+    assert run_at == 1500
+    assert helper.commands == []
+    callback()
+    assert helper.commands == ["land"]
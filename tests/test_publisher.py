@@ -0,0 +1,157 @@
+import time
+
+import paho.mqtt.client as mqtt
+import pytest
+
+from publisher import (
+    DROP_NEWEST,
+    PRIORITY_EVENT,
+    PRIORITY_HEARTBEAT,
+    PRIORITY_LOG,
+    PRIORITY_STATE,
+    Publisher,
+)
+
+
+class RecordingClient:
+    """Stands in for mqtt.Client, records what the worker hands over."""
+
+    class Info:
+        rc = mqtt.MQTT_ERR_SUCCESS
+
+    def __init__(self):
+        self.sent = []
+
+    def publish(self, topic, payload, qos=0):
+        self.sent.append((topic, payload, qos))
+        return self.Info()
+
+
+def drain(publisher, client, count, timeout=2.0):
+    publisher.start()
+    deadline = time.monotonic() + timeout
+    while publisher.stats["published"] < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    publisher.stop()
+    return client.sent
+
+
+def test_publishes_in_priority_order():
+    client = RecordingClient()
+    publisher = Publisher(client)
+    publisher.publish("t", "log", PRIORITY_LOG)
+    publisher.publish("t", "state", PRIORITY_STATE)
+    publisher.publish("t", "heartbeat", PRIORITY_HEARTBEAT)
+    publisher.publish("t", "event", PRIORITY_EVENT)
+
+    sent = drain(publisher, client, 4)
+    assert [payload for _, payload, _ in sent] == ["heartbeat", "event", "state", "log"]
+
+
+def test_full_buffer_evicts_less_important_first():
+    client = RecordingClient()
+    publisher = Publisher(client, max_size=2)
+    publisher.publish("t", "log", PRIORITY_LOG)
+    publisher.publish("t", "state", PRIORITY_STATE)
+    assert publisher.publish("t", "event", PRIORITY_EVENT)
+
+    sent = drain(publisher, client, 2)
+    assert [payload for _, payload, _ in sent] == ["event", "state"]
+    assert publisher.stats["dropped"] == 1
+
+
+def test_full_buffer_never_evicts_more_important():
+    client = RecordingClient()
+    publisher = Publisher(client, max_size=1)
+    publisher.publish("t", "event", PRIORITY_EVENT)
+    assert not publisher.publish("t", "log", PRIORITY_LOG)
+
+    sent = drain(publisher, client, 1)
+    assert [payload for _, payload, _ in sent] == ["event"]
+
+
+def test_drop_newest_keeps_queued_message_of_same_class():
+    client = RecordingClient()
+    publisher = Publisher(client, max_size=1, drop_policy=DROP_NEWEST)
+    publisher.publish("t", "first", PRIORITY_STATE)
+    assert not publisher.publish("t", "second", PRIORITY_STATE)
+
+    sent = drain(publisher, client, 1)
+    assert [payload for _, payload, _ in sent] == ["first"]
+
+
+def test_coalescing_replaces_payload_and_refreshes_age():
+    client = RecordingClient()
+    publisher = Publisher(client, max_age={PRIORITY_STATE: 0.05})
+    publisher.publish("t", "old", PRIORITY_STATE, coalesce_key="state")
+    time.sleep(0.08)
+    publisher.publish("t", "new", PRIORITY_STATE, coalesce_key="state")
+
+    sent = drain(publisher, client, 1)
+    assert [payload for _, payload, _ in sent] == ["new"]
+    assert publisher.stats["coalesced"] == 1
+    assert publisher.stats["stale"] == 0
+
+
+def test_stale_messages_are_dropped():
+    client = RecordingClient()
+    publisher = Publisher(client, max_age={PRIORITY_STATE: 0.01})
+    publisher.publish("t", "stale", PRIORITY_STATE)
+    time.sleep(0.03)
+    publisher.publish("t", "fresh", PRIORITY_STATE)
+
+    sent = drain(publisher, client, 1)
+    assert [payload for _, payload, _ in sent] == ["fresh"]
+    assert publisher.stats["stale"] == 1
+
+
+def test_qos_per_topic_and_class():
+    publisher = Publisher(RecordingClient())
+    publisher.set_topic_qos("server/+", 1, PRIORITY_EVENT)
+    publisher.set_topic_qos("server/7", 2)
+
+    assert publisher.qos_for("server/3", PRIORITY_EVENT) == 1
+    assert publisher.qos_for("server/3", PRIORITY_STATE) == 0
+    assert publisher.qos_for("server/7", PRIORITY_STATE) == 2
+    with pytest.raises(ValueError):
+        publisher.set_topic_qos("server/+", 3)
+
+
+def test_latency_stats_reset_after_snapshot():
+    client = RecordingClient()
+    publisher = Publisher(client)
+    publisher.publish("t", "event", PRIORITY_EVENT)
+    drain(publisher, client, 1)
+
+    stats = publisher.latency_stats()
+    assert stats["event"]["count"] == 1
+    assert stats["event"]["max"] >= 0
+    assert stats["state"]["count"] == 0
+    assert publisher.latency_stats()["event"]["count"] == 0
+
+
+def test_on_sent_runs_for_the_published_payload_only():
+    client = RecordingClient()
+    publisher = Publisher(client)
+    calls = []
+    publisher.publish(
+        "t", "old", PRIORITY_STATE, "state", on_sent=lambda: calls.append("old")
+    )
+    publisher.publish(
+        "t", "new", PRIORITY_STATE, "state", on_sent=lambda: calls.append("new")
+    )
+
+    drain(publisher, client, 1)
+    assert calls == ["new"]
+
+
+def test_withdraw_removes_queued_coalesced_message():
+    client = RecordingClient()
+    publisher = Publisher(client)
+    publisher.publish("t", "progress", PRIORITY_LOG, coalesce_key="progress")
+    assert publisher.withdraw("progress")
+    assert not publisher.withdraw("progress")
+    publisher.publish("t", "result", PRIORITY_EVENT)
+
+    sent = drain(publisher, client, 1)
+    assert [payload for _, payload, _ in sent] == ["result"]
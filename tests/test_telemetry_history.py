@@ -0,0 +1,35 @@
+import numpy as np
+
+from telemetry_history import TelemetryHistory
+
+LAT = 41.1055
+LON = 29.0234
+
+
+def test_faster_stream_still_covers_the_window():
+    history = TelemetryHistory(seconds=10, rate=1)
+    # 10 Hz for 20 s, e.g. while a GCS requests a higher rate
+    for i in range(200):
+        history.append(i / 10, LAT, LON, 5, 0, 0, 0)
+
+    samples = history.window()
+    assert len(samples) == history.capacity
+    assert samples["t"][-1] - samples["t"][0] >= 10
+    assert np.all(np.diff(samples["t"]) >= 0.89)
+
+
+def test_jitter_at_the_requested_rate_keeps_every_sample():
+    history = TelemetryHistory(seconds=10, rate=2)
+    for t in (0.0, 0.48, 1.0, 1.47, 2.0):
+        history.append(t, LAT, LON, 5, 0, 0, 0)
+    assert len(history) == 5
+
+
+def test_reboot_clears_the_buffer():
+    history = TelemetryHistory(seconds=10, rate=1)
+    for t in (100, 101, 102):
+        history.append(t, LAT, LON, 5, 0, 0, 0)
+    history.append(0.5, LAT, LON, 5, 0, 0, 0)
+
+    assert len(history) == 1
+    assert history.latest()["t"] == 0.5
@@ -0,0 +1,85 @@
+import time
+import threading
+from collections import deque
+from typing import Optional
+
+
+def now_ms() -> float:
+    """
+    Current host wall clock time in milliseconds since the epoch.
+    """
+    return time.time() * 1000
+
+
+class ClockOffsetEstimator:
+    """
+    Estimates the offset of a remote clock from ping exchanges.
+
+    Each exchange gives the local send time, the remote time and the local
+    receive time. Assuming a symmetric path the remote time was taken halfway
+    through the round trip. The sample with the smallest round trip over the
+    last few exchanges is used, since it has the least queuing delay.
+    """
+
+    def __init__(self, window: int = 8) -> None:
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.offset: Optional[float] = None
+        self.rtt: Optional[float] = None
+
+    def add_sample(self, local_send: float, remote: float, local_recv: float) -> None:
+        """
+        Args:
+            local_send (float): Local time the request was sent in ms.
+            remote (float): Remote time in the reply in ms.
+            local_recv (float): Local time the reply was received in ms.
+        """
+        rtt = local_recv - local_send
+        if rtt < 0:
+            return
+        with self._lock:
+            self._samples.append((rtt, remote - (local_send + local_recv) / 2))
+            self.rtt, self.offset = min(self._samples)
+
+    def is_synced(self) -> bool:
+        return self.offset is not None
+
+    def to_remote(self, local: float) -> float:
+        return local + self.offset if self.offset is not None else local
+
+    def to_local(self, remote: float) -> float:
+        return remote - self.offset if self.offset is not None else remote
+
+
+class AgeStats:
+    """
+    Collects sample ages (publish time minus capture time) between reports.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._count = 0
+        self._total = 0.0
+        self._max = 0.0
+
+    def add(self, age: float) -> None:
+        with self._lock:
+            self._count += 1
+            self._total += age
+            self._max = max(self._max, age)
+
+    def snapshot(self) -> dict:
+        """
+        Return count, mean and max age in ms since the previous snapshot.
+        """
+        with self._lock:
+            stats = {
+                "count": self._count,
+                "mean": self._total / self._count if self._count else None,
+                "max": self._max if self._count else None,
+            }
+            self._reset()
+        return stats